@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class ServiceConfig(AppConfig):
     name = 'services'
+
+    def ready(self):
+        # connect portal catalog signal receivers
+        import services.signals
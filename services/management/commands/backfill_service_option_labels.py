@@ -0,0 +1,12 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from services.utils.option_labels import backfill_option_labels
+
+
+class Command(BaseCommand):
+    help = "Fill service option labels from field_text1"
+
+    def handle(self, *args, **options):
+        count = backfill_option_labels(apps)
+        self.stdout.write(self.style.SUCCESS("Labels filled for {0} service options.".format(count)))
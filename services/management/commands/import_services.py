@@ -0,0 +1,32 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from services.utils.service_import import import_services, IMPORT_FORMATS, UNSUPPORTED_IMPORT_FORMAT
+
+
+class Command(BaseCommand):
+    help = "Import services with options, logic and tags from a ndjson or csv file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", dest="file_format", default=None)
+        parser.add_argument("--user-id", dest="user_id", type=int, default=None)
+        parser.add_argument("--chunk-size", dest="chunk_size", type=int, default=None)
+
+    def handle(self, *args, **options):
+        file_format = (options['file_format'] or options['path'].rsplit(".", 1)[-1]).lower()
+
+        if file_format not in IMPORT_FORMATS:
+            raise CommandError(UNSUPPORTED_IMPORT_FORMAT.format(file_format))
+
+        user = get_user_model().objects.get(pk=options['user_id']) if options['user_id'] else None
+        kwargs = {'chunk_size': options['chunk_size']} if options['chunk_size'] else {}
+
+        with open(options['path'], encoding="utf-8", newline="") as stream:
+            report = import_services(stream, file_format, user, **kwargs)
+
+        for error in report['errors']:
+            self.stderr.write("Row {0}: {1}".format(error['row'], error['errors']))
+
+        self.stdout.write(self.style.SUCCESS("Imported {0} services, {1} rows failed.".format(
+            report['created'], len(report['errors']))))
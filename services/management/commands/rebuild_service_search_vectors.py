@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from services.models.service import Service
+from services.utils.search import update_service_search_vectors
+
+
+class Command(BaseCommand):
+    help = "Rebuild search vectors of all services"
+
+    def handle(self, *args, **options):
+        count = update_service_search_vectors(Service.objects.values("id"))
+        self.stdout.write(self.style.SUCCESS("Search vectors rebuilt for {0} services.".format(count)))
@@ -0,0 +1,22 @@
+from django.db import models
+
+from stores.models.store import Store
+
+
+class PopularServiceFlush(models.Model):
+    """
+    Id of the last popular service count flush applied per store, a flush which is taken again after
+    a crash is not applied twice
+    """
+    store_id = models.OneToOneField(Store, on_delete=models.CASCADE, db_column='store_id',
+                                    related_name="popular_service_flush")
+    flush_id = models.CharField("Flush Id", max_length=32)
+    updated_on = models.DateTimeField("Updated On", auto_now=True)
+
+    objects = models.Manager()
+
+    class Meta:
+        db_table = 'popular_service_flush'
+
+    def __str__(self):
+        return "{0} - {1}".format(self.store_id_id, self.flush_id)
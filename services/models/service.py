@@ -2,13 +2,15 @@ from decimal import Decimal
 from django.db import models
 from django.conf import settings
 from django.core.validators import MinValueValidator
-from django.utils import timezone
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 
 from activity_logs.models.manager import ActivityLogManager
 from common_config.models.category import Category
 from common_config.models.image import Image
 from addresses.models.admin_address import AdminAddress
 from stores.models.store import Store
+from utils.soft_delete import soft_delete
 
 
 class Service(models.Model):
@@ -18,6 +20,10 @@ class Service(models.Model):
         (3, "Disabled"),
     )
 
+    # status sort position, statuses ordered by label descending
+    STATUS_RANKS = {status: rank for rank, (status, label) in
+                    enumerate(sorted(STATUS_CHOICES, key=lambda choice: choice[1], reverse=True))}
+
     name = models.CharField("Name", max_length=120)
     category_tags = models.ManyToManyField(Category, blank=True, related_name='category_tags')
     item_tags = models.ManyToManyField(Category, blank=True, related_name='item_tags')
@@ -29,10 +35,13 @@ class Service(models.Model):
     store_id = models.ForeignKey(Store, null=True, blank=True, on_delete=models.CASCADE, db_column='store_id')
     address_id = models.ForeignKey(AdminAddress, on_delete=models.PROTECT, db_column='address_id', null=True, blank=True)
     status = models.SmallIntegerField(choices=STATUS_CHOICES, default=1)
+    status_rank = models.SmallIntegerField("Status Rank", default=STATUS_RANKS[1], editable=False)
     is_default = models.BooleanField("Is Default", default=False)
     is_active = models.BooleanField("Is Active", default=True)
     sku = models.CharField("SKU", max_length=120, blank=True)
     is_backend = models.BooleanField("Is Backend", default=False)
+    portal_search_vector = SearchVectorField("Portal Search Vector", null=True, blank=True, editable=False)
+    search_vector = SearchVectorField("Search Vector", null=True, blank=True, editable=False)
 
     created_on = models.DateTimeField(auto_now_add=True)
     updated_on = models.DateTimeField("Updated On", null=True, blank=True)
@@ -44,8 +53,23 @@ class Service(models.Model):
     objects = models.Manager()
     _activity_meta = ActivityLogManager()
 
+    # rows deactivated with soft delete
+    _soft_delete_cascade = (
+        ('price_groups.PriceGroupService', 'service_id'),
+    )
+
     class Meta:
         db_table = 'services'
+        indexes = [
+            GinIndex(fields=['portal_search_vector']),
+            GinIndex(fields=['search_vector']),
+            GinIndex(fields=['name'], name='services_name_trgm_idx', opclasses=['gin_trgm_ops']),
+            models.Index(fields=['is_active', 'status', 'created_on']),
+            models.Index(fields=['is_active', 'status_rank', 'created_on']),
+            models.Index(fields=['is_active', 'price']),
+            models.Index(fields=['is_active', 'name']),
+            models.Index(fields=['is_active', 'created_on']),
+        ]
 
         # add custom permission
         permissions = [('list_service', 'Can list service')]
@@ -53,13 +77,14 @@ class Service(models.Model):
     def __str__(self):
         return "{0}".format(self.name)
 
-    def delete(self, using=None, keep_parents=False):
-        self.is_active = False
-        self.updated_on = timezone.now()
-        self.save()
+    def save(self, *args, **kwargs):
+        self.status_rank = self.STATUS_RANKS.get(self.status, len(self.STATUS_RANKS))
 
-        # update price group service
-        for service_obj in self.price_group_services.all():
-            service_obj.is_active = False
-            service_obj.updated_on = timezone.now()
-            service_obj.save()
\ No newline at end of file
+        update_fields = kwargs.get("update_fields", None)
+        if update_fields is not None and "status" in update_fields:
+            kwargs["update_fields"] = set(update_fields) | {"status_rank"}
+
+        super().save(*args, **kwargs)
+
+    def delete(self, using=None, keep_parents=False):
+        return soft_delete(self, using=using)
@@ -1,11 +1,11 @@
 from django.db import models
 from django.conf import settings
-from django.utils import timezone
 from django.contrib.postgres.fields import JSONField
 
 from activity_logs.models.manager import ActivityLogManager
 from common_config.models.image import Image
 from services.models.service import Service
+from utils.soft_delete import soft_delete
 
 
 class ServiceOption(models.Model):
@@ -43,6 +43,7 @@ class ServiceOption(models.Model):
     other_option_value = models.CharField("Other Option Value", max_length=120, blank=True)
     field_text1 = models.TextField("Field Text1", help_text='csv format')
     field_text2 = models.TextField("Field Text2", help_text='csv format', blank=True)
+    field_labels = JSONField("Field Labels", default=list, blank=True, help_text='ordered option labels')
     images = models.ManyToManyField(Image, blank=True, related_name='option_images')
     is_metal_type = models.BooleanField("Is Metal Type", default=False)
     is_option_cost = models.BooleanField("Is Option Cost", default=False)
@@ -60,6 +61,11 @@ class ServiceOption(models.Model):
     objects = models.Manager()
     _activity_meta = ActivityLogManager()
 
+    # rows deactivated with soft delete
+    _soft_delete_cascade = (
+        ('price_groups.PriceGroupServiceOption', 'service_option_id'),
+    )
+
     class Meta:
         db_table = 'service_options'
 
@@ -70,12 +76,4 @@ class ServiceOption(models.Model):
         return "{0} - {1}".format(self.service_id.name, self.name)
 
     def delete(self, using=None, keep_parents=False):
-        self.is_active = False
-        self.updated_on = timezone.now()
-        self.save()
-
-        # update price group service option
-        for option_obj in self.price_group_options.all():
-            option_obj.is_active = False
-            option_obj.updated_on = timezone.now()
-            option_obj.save()
+        return soft_delete(self, using=using)
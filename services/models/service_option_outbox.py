@@ -0,0 +1,38 @@
+from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.contrib.postgres.fields import JSONField
+
+from services.models.service_option import ServiceOption
+
+
+class ServiceOptionChangeOutbox(models.Model):
+    STATUS_CHOICES = (
+        (1, "Pending"),
+        (2, "Processing"),
+        (3, "Completed"),
+        (4, "Failed"),
+    )
+
+    service_option_id = models.ForeignKey(ServiceOption, on_delete=models.CASCADE, db_column='service_option_id',
+                                          related_name="change_outbox")
+    payload = JSONField(default=dict, encoder=DjangoJSONEncoder)
+    status = models.SmallIntegerField(choices=STATUS_CHOICES, default=1)
+    last_processed_id = models.IntegerField("Last Processed Id", default=0)
+    processed_count = models.IntegerField("Processed Count", default=0)
+    total_count = models.IntegerField("Total Count", null=True, blank=True)
+    attempts = models.SmallIntegerField("Attempts", default=0)
+    error = models.TextField("Error", blank=True)
+
+    created_on = models.DateTimeField(auto_now_add=True)
+    updated_on = models.DateTimeField("Updated On", null=True, blank=True)
+
+    objects = models.Manager()
+
+    class Meta:
+        db_table = 'service_option_change_outbox'
+        indexes = [
+            models.Index(fields=['status', 'created_on']),
+        ]
+
+    def __str__(self):
+        return "{0} - {1}".format(self.service_option_id_id, self.get_status_display())
@@ -0,0 +1,22 @@
+from rest_framework import serializers
+
+from common_config.api_message import INVALID_SERVICE_OPTION_ID
+
+
+class QuoteItemSerializer(serializers.Serializer):
+    price_group_service_id = serializers.IntegerField(required=True)
+    quantity = serializers.IntegerField(required=False, default=1, min_value=1)
+    options = serializers.DictField(required=False, default=dict)
+
+    def validate_options(self, value):
+        # options keys are service option ids
+        invalid_keys = [key for key in value.keys() if not str(key).isnumeric()]
+
+        if invalid_keys:
+            raise serializers.ValidationError(INVALID_SERVICE_OPTION_ID.format(", ".join(invalid_keys)))
+
+        return value
+
+
+class QuoteSerializer(serializers.Serializer):
+    items = QuoteItemSerializer(many=True, allow_empty=False)
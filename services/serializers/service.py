@@ -1,3 +1,4 @@
+from django.db.models import QuerySet
 from django.utils import timezone
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
@@ -16,6 +17,8 @@ from price_groups.utils.price_list_service import add_or_update_price_list_servi
 from services.models.service import Service
 from services.serializers.service_option import ServiceOptionListSerializer
 from services.serializers.service_image import ServiceImageAddSerializer
+from services.utils.query_plan import get_active_options, SERVICE_LIST_DEFERRED_FIELDS
+from services.utils.tags import sync_service_tags, service_tags_changed
 
 
 class ServiceImageSerializer(serializers.ModelSerializer):
@@ -34,11 +37,11 @@ class ServiceFilterListSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Service
-        fields = '__all__'
+        exclude = SERVICE_LIST_DEFERRED_FIELDS
 
     def get_options(self, service):
         # get service option instance
-        options = service.options.filter(is_active=True).order_by("sequence")
+        options = get_active_options(service)
 
         # get service option serializer data
         serializer = ServiceOptionListSerializer(options, many=True)
@@ -59,11 +62,33 @@ class ServiceListSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Service
-        fields = "__all__"
+        exclude = SERVICE_LIST_DEFERRED_FIELDS
 
-    def to_representation(self, instance):
-        data = super(ServiceListSerializer, self).to_representation(instance)
-        return data
+    def __init__(self, *args, **kwargs):
+        super(ServiceListSerializer, self).__init__(*args, **kwargs)
+
+        if self.is_description_deferred(self.instance):
+            # description is loaded only when requested
+            self.fields.pop("description", None)
+
+    @staticmethod
+    def is_description_deferred(instance):
+        """
+        Check whether the listed services were loaded without description
+        :param instance: service queryset, page or list of services
+        :return:
+        """
+        services = getattr(instance, "object_list", instance)
+
+        if isinstance(services, QuerySet):
+            field_names, is_deferred = services.query.deferred_loading
+            return ("description" in field_names) == is_deferred
+
+        if isinstance(services, Service):
+            return "description" in services.get_deferred_fields()
+
+        service = next(iter(services), None) if services is not None else None
+        return service is not None and "description" in service.get_deferred_fields()
 
 
 class ServiceViewSerializer(serializers.ModelSerializer):
@@ -81,6 +106,10 @@ class ServiceViewSerializer(serializers.ModelSerializer):
                   "images",)
 
     def get_price_list(self, service):
+        # use price list aggregated by the detail query plan
+        if hasattr(service, "price_list_data"):
+            return service.price_list_data or []
+
         # get price group
         price_groups = PriceGroup.objects.filter(services__service_id=service.id, services__is_active=True)
 
@@ -94,7 +123,7 @@ class ServiceViewSerializer(serializers.ModelSerializer):
 
     def get_options(self, service):
         # get service option instance
-        options = service.options.filter(is_active=True).order_by("sequence")
+        options = get_active_options(service)
 
         # get service option serializer data
         serializer = ServiceOptionListSerializer(options, many=True)
@@ -121,7 +150,7 @@ class PriceGroupServiceFilterListSerializer(serializers.ModelSerializer):
 
     def get_options(self, service):
         # get service option instance
-        options = service.options.filter(is_active=True).order_by("sequence")
+        options = get_active_options(service)
 
         # get service option serializer data
         serializer = ServiceOptionListSerializer(options, many=True)
@@ -145,28 +174,21 @@ class ServiceMixinSerializer(serializers.ModelSerializer):
 
     def _add_tags(self, service_instance):
         """ Add/Update service category and item tags"""
+        changes = {}
 
         if self.category_tags is not None:
-
-            # un-reference all old data
-            service_instance.category_tags.clear()
-
-            if len(self.category_tags) > 0:
-                category_tags = Category.get_or_create_categories(self.category_tags, SERVICE_CATEGORY)
-
-                # add service category tags
-                service_instance.category_tags.add(*category_tags)
+            # write only added and removed service category tags
+            changes['category_tags'] = sync_service_tags(service_instance, 'category_tags', self.category_tags,
+                                                         SERVICE_CATEGORY)
 
         if self.item_tags is not None:
+            # write only added and removed service item tags
+            changes['item_tags'] = sync_service_tags(service_instance, 'item_tags', self.item_tags, ITEM_CATEGORY)
 
-            # un-reference all old data
-            service_instance.item_tags.clear()
-
-            if len(self.item_tags) > 0:
-                item_tags = Category.get_or_create_categories(self.item_tags, ITEM_CATEGORY)
+        changes = {related_name: change for related_name, change in changes.items() if change[0] or change[1]}
 
-                # add service item tags
-                service_instance.item_tags.add(*item_tags)
+        if len(changes) > 0:
+            service_tags_changed.send(sender=Service, instance=service_instance, changes=changes)
 
     def common(self, data):
         if "item_tags" in data:
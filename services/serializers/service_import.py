@@ -0,0 +1,66 @@
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+from common_config.api_message import ZERO_DECIMAL_VALUE, INVALID_SERVICE_OPTION_LOGIC_COMPARE_FIELD_VALUE, \
+    INVALID_SERVICE_OPTION_LOGIC_APPLY_OPTION_FIELD_ID
+
+from services.models.service import Service
+from services.models.service_option import ServiceOption
+from services.serializers.service_option_logic import ServiceOptionLogicSerializer
+
+DUPLICATE_OPTION_SEQUENCE = "Duplicate service option sequence {0}."
+
+
+class ServiceOptionImportSerializer(serializers.ModelSerializer):
+    sequence = serializers.IntegerField(required=True)
+    option_logic = ServiceOptionLogicSerializer(many=True, required=False)
+
+    class Meta:
+        model = ServiceOption
+        fields = ("name", "is_active", "status", "field_type", "instruction", "tool_tips", "is_required",
+                  "other_option", "other_option_value", "field_text1", "field_text2", "sequence", "option_logic",
+                  "is_metal_type", "is_option_cost", "field_date", "meta_data",)
+
+
+class ServiceImportSerializer(serializers.ModelSerializer):
+    category_tags = serializers.ListField(child=serializers.CharField(max_length=1000), required=True)
+    item_tags = serializers.ListField(child=serializers.CharField(max_length=1000), required=False, default=list)
+    price_list = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+    address_id = serializers.IntegerField(required=True)
+    options = ServiceOptionImportSerializer(many=True, required=False, default=list)
+
+    class Meta:
+        model = Service
+        fields = ("name", "description", "price", "status", "is_default", "is_active", "sku", "category_tags",
+                  "item_tags", "price_list", "address_id", "options",)
+
+    def validate_price(self, value):
+        if value == 0:
+            raise ValidationError(ZERO_DECIMAL_VALUE.format("price"))
+        return value
+
+    def validate(self, attrs):
+        errors = {}
+        sequences = set()
+
+        # option logic refers options by sequence number
+        for option in attrs['options']:
+            if option['sequence'] in sequences:
+                errors.setdefault("options", []).append(DUPLICATE_OPTION_SEQUENCE.format(option['sequence']))
+            sequences.add(option['sequence'])
+
+        for option in attrs['options']:
+            for action in option.get('option_logic', []):
+                if action['apply_to_option_id'] not in sequences:
+                    errors.setdefault("option_logic", []).append(
+                        INVALID_SERVICE_OPTION_LOGIC_APPLY_OPTION_FIELD_ID.format(action['apply_to_option_id']))
+
+                for rule in action['rules']:
+                    if rule['compare_option_field'] not in sequences:
+                        errors.setdefault("option_logic", []).append(
+                            INVALID_SERVICE_OPTION_LOGIC_COMPARE_FIELD_VALUE.format(rule['compare_option_field']))
+
+        if errors:
+            raise ValidationError(errors)
+
+        return attrs
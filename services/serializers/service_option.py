@@ -1,4 +1,4 @@
-import ast
+from django.db import models
 from django.utils import timezone
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
@@ -7,13 +7,17 @@ from common_config.constant import DEFAULT_WARRANTY_METADATA
 from common_config.serializers.image import ImageCreateBulkSerializer, ImageUpdateBulkSerializer, ImageSerializer
 from common_config.models.image import Image
 from common_config.api_message import EXTRA_FIELDS_IN_PAYLOAD, REQUIRED_FIELD, INVALID_SERVICE_OPTION_ID, \
-    INVALID_SERVICE_OPTION_IMAGE_ID, NOT_FOUND_JSON_DATA, INVALID_SERVICE_OPTION_LOGIC_COMPARE_FIELD_VALUE, \
-    INVALID_SERVICE_OPTION_LOGIC_APPLY_OPTION_FIELD_ID, INVALID_OPTION_WARRANTY_METADATA
+    INVALID_SERVICE_OPTION_IMAGE_ID, NOT_FOUND_JSON_DATA, INVALID_SERVICE_OPTION_LOGIC_APPLY_OPTION_FIELD_ID, \
+    INVALID_OPTION_WARRANTY_METADATA
+from utils.bulk_signals import send_bulk_post_save
 
 from services.models.service_option import ServiceOption
 from services.models.service_option_logic import ServiceOptionAction, ServiceOptionRule
 from services.serializers.service_option_logic import ServiceOptionLogicSerializer, ServiceOptionLogicViewSerializer
-from price_groups.models.price_group_service_option import PriceGroupServiceOption
+from services.utils.portal_catalog import get_service_store_ids, refresh_portal_catalog
+from services.utils.option_logic import recompile_option_logic, clear_option_logic, build_service_option_rules
+from services.utils.option_labels import split_option_labels, get_option_label_text, OPTION_LABEL_FIELD_TYPES
+from services.utils.option_propagation import queue_service_option_changes
 
 
 class ServiceOptionSerializerSuperAdminMixin(serializers.ModelSerializer):
@@ -21,7 +25,8 @@ class ServiceOptionSerializerSuperAdminMixin(serializers.ModelSerializer):
 
     class Meta:
         model = ServiceOption
-        fields = '__all__'
+        # labels are served in field_text1
+        exclude = ("field_labels",)
 
 
 class ServiceOptionSerializerCustomerPortalMixin(serializers.ModelSerializer):
@@ -37,14 +42,13 @@ class ServiceOptionSerializerCustomerPortalMixin(serializers.ModelSerializer):
 class ServiceOptionViewSerializer(serializers.ModelSerializer):
     class Meta:
         model = ServiceOption
-        fields = '__all__'
+        exclude = ("field_labels",)
 
     def to_representation(self, instance):
         data = super(ServiceOptionViewSerializer, self).to_representation(instance)
 
-        if instance.field_type in [5, 6, 10, 11]:
-            label_list = ast.literal_eval(instance.field_text1)
-            data['field_text1'] = ",".join(label_list)
+        if instance.field_type in OPTION_LABEL_FIELD_TYPES:
+            data['field_text1'] = get_option_label_text(instance)
 
         return data
 
@@ -55,14 +59,13 @@ class ServiceOptionListSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = ServiceOption
-        fields = '__all__'
+        exclude = ("field_labels",)
 
     def to_representation(self, instance):
         data = super(ServiceOptionListSerializer, self).to_representation(instance)
 
-        if instance.field_type in [5, 6, 10, 11]:
-            label_list = ast.literal_eval(instance.field_text1)
-            data['field_text1'] = ",".join(label_list)
+        if instance.field_type in OPTION_LABEL_FIELD_TYPES:
+            data['field_text1'] = get_option_label_text(instance)
 
         return data
 
@@ -70,12 +73,11 @@ class ServiceOptionListSerializer(serializers.ModelSerializer):
 class ServiceOptionBulkCreateUpdateSerializer(serializers.ListSerializer):
 
     @staticmethod
-    def create_or_update_option_images(images, instance):
+    def save_option_images(images):
         """
-        Create or update service option images
+        Create, update or delete service option images
         :param images:
-        :param instance:
-        :return:
+        :return: created and updated image ids
         """
         create_images = []
         update_images = []
@@ -105,11 +107,22 @@ class ServiceOptionBulkCreateUpdateSerializer(serializers.ListSerializer):
         if len(delete_image) > 0:
             Image.delete_bulk_images(delete_image)
 
-        # set reference service option images ids
-        instance.images.add(*image_ids)
+        return image_ids
+
+    @staticmethod
+    def link_option_images(option_images):
+        """
+        Link images of service options in one through table insert, existing links are kept
+        :param option_images: [(service option instance, image ids)]
+        :return:
+        """
+        through_model = ServiceOption.images.through
+
+        links = [through_model(serviceoption_id=instance.id, image_id=getattr(image_id, 'pk', image_id))
+                 for instance, image_ids in option_images for image_id in image_ids]
 
-        # add/update price list service option images
-        # TODO
+        if len(links) > 0:
+            through_model.objects.bulk_create(links, ignore_conflicts=True)
 
     def create(self, validated_data):
         """
@@ -117,112 +130,65 @@ class ServiceOptionBulkCreateUpdateSerializer(serializers.ListSerializer):
         :param validated_data:
         :return:
         """
-        option_sequence_mapping = {}
         option_logic_rules = []
-        createOptionIds = []
+        option_images = []
+        instances = []
 
         for option in validated_data:
             images = option.pop("option_images", None)
             option_logic = option.pop("option_logic", None)
-            sequence = option.get("sequence")
 
             if "method" in option:
                 del option['method']
 
-            if "field_text1" in option and 'field_type' in option and option['field_type'] in [5, 6, 10, 11]:
-                label_list = option['field_text1'].split(",")
+            if "field_text1" in option and 'field_type' in option and option['field_type'] in OPTION_LABEL_FIELD_TYPES:
+                label_list = split_option_labels(option['field_text1'])
                 field_text1 = {label: "" for label in label_list}
                 option['field_text1'] = str(field_text1)
+                option['field_labels'] = label_list
 
             if "meta_data" not in option and 'field_type' in option and option['field_type'] in [12]:
                 option['meta_data'] = DEFAULT_WARRANTY_METADATA
 
-            # create service option
-            instance = ServiceOption.objects.create(**option)
-
-            option_sequence_mapping[sequence] = instance
-
-            if instance.field_type in [12]:
-                createOptionIds.append(instance.id)
+            instance = ServiceOption(**option)
+            instances.append(instance)
 
             if option_logic is not None:
                 option_logic_rules.append(option_logic)
 
             if images is not None:
-                self.create_or_update_option_images(images, instance)
-
-        if createOptionIds:
-            self.context['request'].session['createOptionIds'] = createOptionIds
-
-        # if len(option_logic_rules) > 0 and len(option_sequence_mapping) > 0:
-        #     self.create_service_option_logic()
-        return option_logic_rules, option_sequence_mapping
-
-    @staticmethod
-    def create_logic_query(logic_query, conditional_join, operator_type, compare_to, is_last):
-        """
-        :param logic_query:
-        :param conditional_join:
-        :param operator_type:
-        :param compare_to:
-        :param is_last:
-        :return:
-        """
-        conditional_join_reg = {'all': 'and', 'none': 'and', 'one': 'or'}
-        logic_query = "{0} compare_option_field {1} '{2}'".format(logic_query, operator_type, compare_to)
-
-        if not is_last:
-            logic_query = "{0} {1}".format(logic_query, conditional_join_reg[conditional_join])
-        return logic_query
-
-    def create_service_option_rules(self, rules, option_sequence_mapping, action_instance):
-        """
-        :param rules:
-        :param option_sequence_mapping:
-        :param action_instance:
-        :return:
-        """
-        logic_query = "where "
-        is_last = False
-        errors = []
-
-        for idx, rule in enumerate(rules, start=1):
-            rule['option_action_id'] = action_instance
-            rule_error = {}
-
-            # validate service option sequence number with compare_option_field if not match raise error message
-            if rule['compare_option_field'] not in option_sequence_mapping:
-                rule_error.setdefault("compare_option_field", []).append(
-                    INVALID_SERVICE_OPTION_LOGIC_COMPARE_FIELD_VALUE.format(rule['compare_option_field']))
-                errors.append(rule_error)
-                continue
+                option_images.append((instance, images))
 
-            # replace database id to sequence number
-            rule['compare_option_field'] = option_sequence_mapping[rule['compare_option_field']]
+        # create service options, ids are returned by postgres
+        ServiceOption.objects.bulk_create(instances)
+        send_bulk_post_save(ServiceOption, instances)
 
-            # add new service option action rules
-            ServiceOptionRule.objects.create(**rule)
+        option_sequence_mapping = {instance.sequence: instance for instance in instances}
+        createOptionIds = [instance.id for instance in instances if instance.field_type in [12]]
 
-            if len(rules) == idx:
-                is_last = True
+        # upload option images and link them in one insert
+        self.link_option_images([(instance, self.save_option_images(images)) for instance, images in option_images])
 
-            # create option logic query
-            logic_query = self.create_logic_query(logic_query, action_instance.conditional_join,
-                                                  rule['operator_type'], rule['compare_to'], is_last)
+        # bulk create skips post_save signals
+        service_ids = {instance.service_id_id for instance in instances}
+        recompile_option_logic(service_ids)
+        refresh_portal_catalog(get_service_store_ids(service_ids))
 
-        if len(errors) > 0:
-            raise serializers.ValidationError({'options': [{'option_logic': [{'rules': [errors]}]}]})
+        if createOptionIds:
+            self.context['request'].session['createOptionIds'] = createOptionIds
 
-        action_instance.conditional_logic = logic_query
-        action_instance.save()
+        return option_logic_rules, option_sequence_mapping
 
     def create_service_option_logic(self, option_sequence_mapping, option_logic_rules):
         """
+        Replace logic of options with new actions and rules, all validated before any write
         :param option_sequence_mapping:
         :param option_logic_rules:
         :return:
         """
         errors = {}
+        rule_errors = []
+        option_actions = {}
 
         for option_logics in option_logic_rules:
             for action in option_logics:
@@ -237,101 +203,49 @@ class ServiceOptionBulkCreateUpdateSerializer(serializers.ListSerializer):
                 # replace database id to sequence number
                 action['apply_to_option_id'] = option_sequence_mapping[action['apply_to_option_id']]
 
-                # delete old service option logic rules
-                old_option_logic_rules = action['apply_to_option_id'].option_logic.all()
-                if len(old_option_logic_rules) > 0:
-                    for old_option_logic_rule in old_option_logic_rules:
-                        old_option_logic_rule.delete()
+                action_instance = ServiceOptionAction(**action)
+                action_rules, action_rule_errors = build_service_option_rules(rules, option_sequence_mapping,
+                                                                              action_instance)
+                rule_errors.extend(action_rule_errors)
 
-                # add new service option action
-                action_instance = ServiceOptionAction.objects.create(**action)
-
-                # add new service option action rules
-                self.create_service_option_rules(rules, option_sequence_mapping, action_instance)
+                # an option keeps one action, the last action given for it replaces the others
+                option_actions[action['apply_to_option_id'].id] = (action_instance, action_rules)
 
         if len(errors) > 0:
             raise serializers.ValidationError({'options': [{'option_logic': [errors]}]})
 
-    @staticmethod
-    def add_or_update_price_group_service_option_images(instance, images):
-        # un-reference all old data
-        instance.images.clear()
-
-        if len(images) > 0:
-            # add/update price group service option images
-            instance.images.add(*images)
-
-    def update_store_option_label(self, price_group_service_option, new_field_text1):
-        store_service_option = price_group_service_option.store_service_option.all()
+        if len(rule_errors) > 0:
+            raise serializers.ValidationError({'options': [{'option_logic': [{'rules': [rule_errors]}]}]})
 
-        for str_option_obj in store_service_option:
-            old_field_text1 = ast.literal_eval(str_option_obj.field_text1)
-            str_option_obj.field_text1 = self.transform_option_label(old_field_text1, new_field_text1)
-            str_option_obj.save()
+        if len(option_actions) <= 0:
+            return
 
-    def transform_option_label(self, old_field_text1, new_field_text1):
-        new_dict = {}
-        added, removed = self.compare_field_text1(old_field_text1, new_field_text1)
+        # delete old service option logic in two set based deletes, post_delete receivers would
+        # recompile the logic once per row
+        clear_option_logic(option_actions.keys())
 
-        for key1, value1 in old_field_text1.items():
-            update_key = key1
-            update_value = value1
-
-            if key1 in removed:
-                for key2, value2 in new_field_text1.items():
-                    if key2 in key1 and key2 not in old_field_text1:
-                        update_key = key2
-
-            new_dict[update_key] = update_value
-
-        for add_key in added:
-            if add_key not in new_dict:
-                new_dict[add_key] = ""
-
-        for del_key in removed:
-            if del_key in new_dict:
-                del new_dict[del_key]
-
-        return str(new_dict)
-
-    @staticmethod
-    def compare_field_text1(field_test1_old, field_test1_new):
-        field_test1_old_keys = set(field_test1_old.keys())
-        field_test1_new_keys = set(field_test1_new.keys())
-        removed = field_test1_old_keys - field_test1_new_keys
-        added = field_test1_new_keys - field_test1_old_keys
+        action_rule_instances = list(option_actions.values())
+        action_instances = [action_instance for action_instance, _ in action_rule_instances]
 
-        return list(added), list(removed)
+        # add new service option actions, ids are returned by postgres
+        ServiceOptionAction.objects.bulk_create(action_instances)
+        send_bulk_post_save(ServiceOptionAction, action_instances)
 
-    def update_price_list_service_option(self, instance, updated_price_list_option_payload, images):
-        # get all service option related price list service options
-        price_group_service_options = PriceGroupServiceOption.objects.filter(service_option_id=instance.id)
+        # rules were built before their action was saved
+        rule_instances = []
+        for action_instance, action_rules in action_rule_instances:
+            for rule in action_rules:
+                rule.option_action_id_id = action_instance.pk
+            rule_instances.extend(action_rules)
 
-        for price_group_service_option in price_group_service_options:
+        # add new service option action rules
+        ServiceOptionRule.objects.bulk_create(rule_instances)
+        send_bulk_post_save(ServiceOptionRule, rule_instances)
 
-            if "field_text1" in updated_price_list_option_payload and instance.field_type in [5, 6, 10, 11] and \
-                    price_group_service_option.field_type in [5, 6, 10, 11]:
-                field_text1 = ast.literal_eval(price_group_service_option.field_text1)
-                # compare service option field_text1 value to price list service option field_text1 value
-                price_group_service_option.field_text1 = self.transform_option_label(field_text1,
-                                                                                     updated_price_list_option_payload[
-                                                                                         'field_text1'])
-
-                # update all store service option
-                self.update_store_option_label(price_group_service_option,
-                                               updated_price_list_option_payload['field_text1'])
-
-                del updated_price_list_option_payload['field_text1']
-
-            # set key and items
-            for key, item in updated_price_list_option_payload.items():
-                setattr(price_group_service_option, key, item)
-
-            # update price list service option
-            price_group_service_option.save()
-
-            if images is not None:
-                self.add_or_update_price_group_service_option_images(price_group_service_option, images)
+        # bulk create skips post_save signals
+        service_ids = {action.apply_to_option_id.service_id_id for action in action_instances}
+        recompile_option_logic(service_ids)
+        refresh_portal_catalog(get_service_store_ids(service_ids))
 
     def update_bulk_records(self, validated_data):
         """
@@ -342,6 +256,13 @@ class ServiceOptionBulkCreateUpdateSerializer(serializers.ListSerializer):
 
         option_sequence_mapping = {}
         option_logic_rules = []
+        option_images = []
+        price_list_payloads = {}
+        updated_fields = {'updated_on'}
+        updated_on = timezone.now()
+
+        # get all service option objects in one query
+        instances = ServiceOption.objects.in_bulk([option['id'].id for option in validated_data])
 
         for option in validated_data:
 
@@ -354,8 +275,10 @@ class ServiceOptionBulkCreateUpdateSerializer(serializers.ListSerializer):
             if "method" in option:
                 del option['method']
 
-            # get service option object
-            instance = ServiceOption.objects.get(pk=option_id, service_id=service_id)
+            instance = instances.get(option_id)
+
+            if instance is None or instance.service_id_id != service_id:
+                raise ServiceOption.DoesNotExist("ServiceOption matching query does not exist.")
 
             option_sequence_mapping[sequence] = instance
 
@@ -363,7 +286,7 @@ class ServiceOptionBulkCreateUpdateSerializer(serializers.ListSerializer):
                 option_logic_rules.append(option_logic)
 
             if images is not None:
-                self.create_or_update_option_images(images, instance)
+                option_images.append((instance, self.save_option_images(images)))
 
             updated_price_list_option_payload = dict()
 
@@ -376,11 +299,12 @@ class ServiceOptionBulkCreateUpdateSerializer(serializers.ListSerializer):
             if "field_text2" in option:
                 updated_price_list_option_payload['field_text2'] = option['field_text2']
 
-            if "field_text1" in option and instance.field_type in [5, 6, 10, 11]:
-                label_list = option['field_text1'].split(",")
+            if "field_text1" in option and instance.field_type in OPTION_LABEL_FIELD_TYPES:
+                label_list = split_option_labels(option['field_text1'])
                 field_text1 = {label: "" for label in label_list}
                 updated_price_list_option_payload['field_text1'] = field_text1
                 option['field_text1'] = str(field_text1)
+                option['field_labels'] = label_list
 
             elif "field_text1" in option:
                 updated_price_list_option_payload['field_text1'] = option['field_text1']
@@ -394,19 +318,46 @@ class ServiceOptionBulkCreateUpdateSerializer(serializers.ListSerializer):
             if "meta_data" in option and instance.field_type in [12]:
                 updated_price_list_option_payload['meta_data'] = option['meta_data']
 
-            # set key and items
+            # set key and items, only changed fields are written, relations are compared by id
             for key, item in option.items():
-                setattr(instance, key, item)
+                attname = ServiceOption._meta.get_field(key).attname
+                value = item.pk if isinstance(item, models.Model) else item
 
-            instance.updated_on = timezone.now()
+                if getattr(instance, attname) != value:
+                    setattr(instance, attname, value)
+                    updated_fields.add(key)
 
-            # update service option
-            instance.save()
+            instance.updated_on = updated_on
 
             if len(updated_price_list_option_payload) > 0:
-                updated_images = instance.images.all() if images is not None else None
+                price_list_payloads[instance.id] = (instance, updated_price_list_option_payload,
+                                                    None if images is None else [])
+
+        if len(instances) <= 0:
+            return option_logic_rules, option_sequence_mapping
+
+        # update service options
+        ServiceOption.objects.bulk_update(list(instances.values()), list(updated_fields))
+
+        # link new service option images
+        self.link_option_images(option_images)
+
+        if len(price_list_payloads) > 0:
+            # price list options get the full image list of their service option
+            option_ids = [option_id for option_id, payload in price_list_payloads.items() if payload[2] is not None]
+            image_links = ServiceOption.images.through.objects.filter(serviceoption_id__in=option_ids) \
+                .values_list("serviceoption_id", "image_id")
+
+            for option_id, image_id in image_links:
+                price_list_payloads[option_id][2].append(image_id)
+
+            # price list and store options are rewritten by a background job
+            queue_service_option_changes(price_list_payloads)
 
-                self.update_price_list_service_option(instance, updated_price_list_option_payload, updated_images)
+        # bulk update skips post_save signals
+        service_ids = {instance.service_id_id for instance in instances.values()}
+        recompile_option_logic(service_ids)
+        refresh_portal_catalog(get_service_store_ids(service_ids))
 
         return option_logic_rules, option_sequence_mapping
 
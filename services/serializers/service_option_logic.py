@@ -1,8 +1,11 @@
 from rest_framework import serializers
 
-from common_config.api_message import REQUIRED_FIELD, NOT_FOUND_JSON_DATA, INVALID_SERVICE_OPTION_LOGIC_COMPARE_TO
+from common_config.api_message import REQUIRED_FIELD, NOT_FOUND_JSON_DATA, INVALID_SERVICE_OPTION_LOGIC_COMPARE_TO, \
+    INVALID_SERVICE_OPTION_ID
 
+from services.models.service import Service
 from services.models.service_option_logic import ServiceOptionAction, ServiceOptionRule
+from services.utils.option_logic import INVALID_OPTION_LOGIC_SERVICE
 
 
 class ServiceOptionRuleSerializer(serializers.ModelSerializer):
@@ -82,3 +85,35 @@ class ServiceOptionLogicSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(errors)
 
         return attrs
+
+
+class ServiceOptionAnswerSerializer(serializers.Serializer):
+    service_id = serializers.IntegerField(required=True)
+    answers = serializers.DictField(required=False, default=dict)
+
+    def validate_answers(self, value):
+        # answers keys are service option ids
+        invalid_keys = [key for key in value.keys() if not str(key).isnumeric()]
+
+        if invalid_keys:
+            raise serializers.ValidationError(INVALID_SERVICE_OPTION_ID.format(", ".join(invalid_keys)))
+
+        return value
+
+
+class ServiceOptionVisibilitySerializer(serializers.Serializer):
+    services = ServiceOptionAnswerSerializer(many=True, allow_empty=False)
+
+    def validate_services(self, value):
+        # option logic is evaluated only for active and published services
+        service_ids = {item['service_id'] for item in value}
+        visible_ids = set(Service.objects.filter(id__in=service_ids, is_active=True, status=2)
+                          .values_list("id", flat=True))
+
+        invalid_ids = sorted(service_ids - visible_ids)
+
+        if invalid_ids:
+            raise serializers.ValidationError(INVALID_OPTION_LOGIC_SERVICE.format(
+                ", ".join(str(service_id) for service_id in invalid_ids)))
+
+        return value
@@ -0,0 +1,167 @@
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from common_config.models.category import Category
+from insurances.models.insurance import Insurance
+from price_groups.models.price_group import StorePriceGroup
+from price_groups.models.price_group_service import PriceGroupService, StorePriceGroupService
+from price_groups.models.price_group_service_option import PriceGroupServiceOption
+from stores.models.store import Store
+from stores.models.store_setting import StoreSetting
+from services.models.service import Service
+from services.models.service_option import ServiceOption
+from services.models.service_option_logic import ServiceOptionAction, ServiceOptionRule
+from services.utils.portal_catalog import get_service_store_ids, refresh_portal_catalog
+from services.utils.search import update_service_search_vectors
+from services.utils.option_logic import recompile_option_logic
+from services.utils.tags import service_tags_changed
+from utils.soft_delete import soft_deleted
+
+
+@receiver(post_save, sender=Service)
+def service_saved(sender, instance, **kwargs):
+    update_service_search_vectors([instance.id])
+    refresh_portal_catalog(get_service_store_ids([instance.id]))
+
+
+@receiver(soft_deleted, sender=Service)
+def service_soft_deleted(sender, instance, **kwargs):
+    # price list copies are deactivated with the service
+    refresh_portal_catalog(get_service_store_ids([instance.pk]))
+
+
+@receiver(service_tags_changed, sender=Service)
+def service_tags_synced(sender, instance, **kwargs):
+    update_service_search_vectors([instance.pk])
+    refresh_portal_catalog(get_service_store_ids([instance.pk]))
+
+
+@receiver(m2m_changed, sender=Service.category_tags.through)
+@receiver(m2m_changed, sender=Service.item_tags.through)
+def service_tag_links_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ["post_add", "post_remove", "post_clear"]:
+            update_service_search_vectors([instance.pk])
+            refresh_portal_catalog(get_service_store_ids([instance.pk]))
+        return
+
+    # tag side changes, collect linked services before clear
+    if action == "pre_clear":
+        instance._cleared_service_ids = list(instance.category_tags.values_list("id", flat=True)) + \
+                                        list(instance.item_tags.values_list("id", flat=True))
+
+    elif action == "post_clear":
+        service_ids = getattr(instance, "_cleared_service_ids", [])
+        update_service_search_vectors(service_ids)
+        refresh_portal_catalog(get_service_store_ids(service_ids))
+
+    elif action in ["post_add", "post_remove"]:
+        update_service_search_vectors(pk_set)
+        refresh_portal_catalog(get_service_store_ids(pk_set))
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, created, **kwargs):
+    if created:
+        return
+
+    # refresh search document and portal catalog of services tagged with renamed category
+    service_ids = Service.objects.filter(Q(category_tags=instance) | Q(item_tags=instance)).values("id")
+
+    update_service_search_vectors(service_ids)
+    refresh_portal_catalog(get_service_store_ids(service_ids))
+
+
+@receiver(post_save, sender=ServiceOption)
+def service_option_saved(sender, instance, **kwargs):
+    if kwargs.get("bulk", False):
+        return
+
+    recompile_option_logic([instance.service_id_id])
+    refresh_portal_catalog(get_service_store_ids([instance.service_id_id]))
+
+
+@receiver(soft_deleted, sender=ServiceOption)
+def service_option_soft_deleted(sender, instance, **kwargs):
+    # price list option copies are deactivated with the option
+    recompile_option_logic([instance.service_id_id])
+    refresh_portal_catalog(get_service_store_ids([instance.service_id_id]))
+
+
+@receiver(post_save, sender=ServiceOptionAction)
+@receiver(post_delete, sender=ServiceOptionAction)
+def service_option_action_changed(sender, instance, **kwargs):
+    if kwargs.get("bulk", False):
+        return
+
+    service_ids = ServiceOption.objects.filter(id=instance.apply_to_option_id_id).values_list("service_id", flat=True)
+
+    recompile_option_logic(service_ids)
+    refresh_portal_catalog(get_service_store_ids(service_ids))
+
+
+@receiver(post_save, sender=ServiceOptionRule)
+@receiver(post_delete, sender=ServiceOptionRule)
+def service_option_rule_changed(sender, instance, **kwargs):
+    if kwargs.get("bulk", False):
+        return
+
+    service_ids = ServiceOption.objects.filter(id=instance.compare_option_field_id).values_list("service_id",
+                                                                                                 flat=True)
+
+    recompile_option_logic(service_ids)
+    refresh_portal_catalog(get_service_store_ids(service_ids))
+
+
+@receiver(post_save, sender=PriceGroupService)
+def price_group_service_saved(sender, instance, **kwargs):
+    if kwargs.get("bulk", False):
+        return
+
+    refresh_portal_catalog(StorePriceGroupService.objects.filter(price_group_service_id=instance.id)
+                           .values_list("store_id", flat=True).distinct())
+
+
+@receiver(post_save, sender=PriceGroupServiceOption)
+def price_group_service_option_saved(sender, instance, **kwargs):
+    if kwargs.get("bulk", False):
+        return
+
+    refresh_portal_catalog(get_service_store_ids(
+        ServiceOption.objects.filter(id=instance.service_option_id_id).values("service_id")))
+
+
+@receiver(post_save, sender=StorePriceGroupService)
+def store_price_group_service_saved(sender, instance, **kwargs):
+    if kwargs.get("bulk", False):
+        return
+
+    refresh_portal_catalog([instance.store_id_id])
+
+
+@receiver(post_save, sender=Store)
+def store_saved(sender, instance, **kwargs):
+    refresh_portal_catalog([instance.id])
+
+
+@receiver(soft_deleted, sender=Store)
+def store_soft_deleted(sender, instance, **kwargs):
+    # store services and addresses are deactivated with the store
+    refresh_portal_catalog([instance.pk])
+
+
+@receiver(post_save, sender=StorePriceGroup)
+@receiver(post_delete, sender=StorePriceGroup)
+def store_price_group_changed(sender, instance, **kwargs):
+    refresh_portal_catalog([instance.store_id_id])
+
+
+@receiver(post_save, sender=Insurance)
+def insurance_saved(sender, instance, **kwargs):
+    refresh_portal_catalog(Store.objects.filter(insurance_id=instance.id).values_list("id", flat=True))
+
+
+@receiver(post_save, sender=StoreSetting)
+def store_setting_saved(sender, instance, **kwargs):
+    refresh_portal_catalog([instance.store_id_id])
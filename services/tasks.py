@@ -1,21 +1,105 @@
+from datetime import timedelta
 from celery import shared_task
-from services.models.popular_service import PopularService
-from services.serializers.popular_service import PopularServiceSerializer
+from django.utils import timezone
+
+from services.models.service_option_outbox import ServiceOptionChangeOutbox
+from services.utils.option_propagation import process_service_option_change, claimable_changes
+from services.utils.resequence import resequence_all_service_options
+from services.utils.option_logic import recompile_option_logic
+from services.utils.popularity import get_popularity_counter, flush_popular_service_counts
+from services.utils.portal_catalog import PORTAL_CATALOG_VARIANTS, release_portal_catalog_rebuild, \
+    get_service_store_ids, build_portal_catalog, refresh_portal_catalog
+from stores.models.store import Store
+from stores.utils.store_context import resolve_store_context, store_context_cache
 
 
 @shared_task
 def popular_service_count_increment(response):
-    for item in response['items']:
-        try:
-            popular_service = PopularService.objects.get(service_id=item['price_group_service']["service_id"],
-                                                         store_id=response['store']['id'])
-        except Exception as err:
-            payload = dict(service_id=item['price_group_service']["service_id"], count=1,
-                           store_id=response['store']['id'])
-            serializer = PopularServiceSerializer(data=payload)
-
-            if serializer.is_valid():
-                serializer.create(serializer.validated_data)
-        else:
-            popular_service.count = popular_service.count + 1
-            popular_service.save()
+    service_ids = [item['price_group_service']["service_id"] for item in response['items']]
+
+    # count order services, counts are persisted by flush_popular_service_counts_task
+    get_popularity_counter().incr(response['store']['id'], service_ids)
+
+
+@shared_task
+def flush_popular_service_counts_task():
+    return flush_popular_service_counts()
+
+
+@shared_task
+def build_store_portal_catalog_task(store_id):
+    # allow the next change to queue a new rebuild while this one is running
+    release_portal_catalog_rebuild(store_id)
+
+    # cached context of this worker may be older than the change which queued the rebuild
+    store_context_cache.invalidate(store_id)
+    store_context = resolve_store_context(store_id=store_id)
+
+    if store_context is None or not store_context.is_active or not store_context.is_onboarding_complete \
+            or store_context.price_group_id is None or store_context.settings is None:
+        # store portal is not available, catalog is built on the first portal request
+        return
+
+    store_obj = Store.objects.get(pk=store_id)
+
+    for variant in PORTAL_CATALOG_VARIANTS:
+        build_portal_catalog(store_context, variant, store_obj)
+
+
+@shared_task(bind=True, max_retries=5, default_retry_delay=60)
+def propagate_service_option_change_task(self, outbox_id):
+    def progress(processed_count, total_count):
+        self.update_state(state='PROGRESS', meta={'processed': processed_count, 'total': total_count})
+
+    try:
+        outbox = process_service_option_change(outbox_id, progress=progress)
+    except Exception as err:
+        ServiceOptionChangeOutbox.objects.filter(pk=outbox_id, status=2).update(status=4, error=str(err),
+                                                                                updated_on=timezone.now())
+        # committed chunks are skipped on retry, changes out of attempts are not claimed again
+        raise self.retry(exc=err)
+
+    if outbox is None:
+        # deleted, processed by another job, completed, out of attempts or waiting for an older change of the option
+        return
+
+    refresh_portal_catalog(get_service_store_ids([outbox.service_option_id.service_id_id]))
+
+    return {'processed': outbox.processed_count, 'total': outbox.total_count}
+
+
+@shared_task
+def dispatch_service_option_changes_task(older_than_minutes=10):
+    """
+    Queue again claimable outbox changes whose job was lost or ran out of retries, changes of a running job are
+    not queued
+    :param older_than_minutes:
+    :return:
+    """
+    now = timezone.now()
+    outbox_ids = list(claimable_changes(now).filter(updated_on__lt=now - timedelta(minutes=older_than_minutes))
+                      .order_by("id").values_list("id", flat=True))
+
+    for outbox_id in outbox_ids:
+        propagate_service_option_change_task.delay(outbox_id)
+
+    return len(outbox_ids)
+
+
+@shared_task(bind=True)
+def resequence_service_options_task(self, service_id=None):
+    def progress(processed_count, total_count):
+        self.update_state(state='PROGRESS', meta={'processed': processed_count, 'total': total_count})
+
+    changed_service_ids, price_list_service_ids, price_list_count = resequence_all_service_options(
+        service_id, progress=progress)
+
+    # raw updates skip post_save signals
+    if len(changed_service_ids) > 0:
+        recompile_option_logic(changed_service_ids)
+
+    # portal serves price list option order, which may be corrected without any service option change
+    if len(changed_service_ids | price_list_service_ids) > 0:
+        refresh_portal_catalog(get_service_store_ids(changed_service_ids | price_list_service_ids))
+
+    return {'services': len(changed_service_ids), 'price_list_options': price_list_count}
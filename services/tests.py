@@ -1,3 +1,320 @@
+import io
+import json
+from unittest import mock
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIRequestFactory
+
+from common_config.constant import SERVICE_CATEGORY, ITEM_CATEGORY
+from common_config.models.category import Category
+from services.models.service import Service
+from services.models.service_option import ServiceOption
+from services.models.service_option_logic import ServiceOptionAction, ServiceOptionRule
+from services.models.popular_service import PopularService
+from price_groups.models.price_group import PriceGroup
+from price_groups.models.price_group_service import PriceGroupService, StorePriceGroupService
+from price_groups.serializers.price_group_service import CustomerPortalServiceViewSerializer
+from services.serializers.service import ServiceFilterListSerializer
+from services.utils.query_plan import prefetch_services, prefetch_portal_services
+from services.views.search_service import CustomerPortalServiceDetailView
+from services.utils.popularity import LocalPopularityCounter, flush_popular_service_counts
+from services.utils.service_import import read_import_rows, validate_import_chunk, import_services, \
+    INVALID_IMPORT_FILE
+from stores.models.store import Store
+from utils.soft_delete import soft_deleted
+
+
+def create_store():
+    return Store.objects.create(name="Gold Smith", subdomain="goldsmith", url="goldsmith.example.com",
+                                first_name="Jane", last_name="Smith", public_email="shop@example.com",
+                                owner_email="owner@example.com", owner_phone="5550100")
+
+
+class ServiceQueryPlanTestCase(TestCase):
+
+    def setUp(self):
+        self.category = Category.objects.create(name="Rings", entity_type=SERVICE_CATEGORY)
+        self.item = Category.objects.create(name="Gold", entity_type=ITEM_CATEGORY)
+        self.store = create_store()
+        self.price_group = PriceGroup.objects.create(name="Retail")
+
+    def create_services(self, count):
+        for idx in range(count):
+            service = Service.objects.create(name="Ring Resize {0}".format(idx), price=10, status=2)
+            service.category_tags.add(self.category)
+            service.item_tags.add(self.item)
+            PriceGroupService.objects.create(price_group_id=self.price_group, service_id=service, price=10)
+
+            size = ServiceOption.objects.create(service_id=service, name="Size", field_type=1, field_text1="",
+                                                sequence=1)
+            metal = ServiceOption.objects.create(service_id=service, name="Metal", field_type=5,
+                                                 field_text1=str({"Gold": "", "Silver": ""}), sequence=2)
+            ServiceOption.objects.create(service_id=service, name="Note", field_type=2, field_text1="", sequence=3,
+                                         is_active=False)
+
+            action = ServiceOptionAction.objects.create(apply_to_option_id=size, action="show",
+                                                        conditional_join="all")
+            ServiceOptionRule.objects.create(option_action_id=action, compare_option_field=metal, operator_type="=",
+                                             compare_to="Gold")
+
+    @staticmethod
+    def serialize_services():
+        with CaptureQueriesContext(connection) as context:
+            data = ServiceFilterListSerializer(prefetch_services(Service.objects.order_by("id")), many=True).data
+
+        return data, len(context.captured_queries)
+
+    def serialize_portal_services(self):
+        services = PriceGroupService.objects.filter(price_group_id=self.price_group).order_by("id")
+
+        with CaptureQueriesContext(connection) as context:
+            data = CustomerPortalServiceViewSerializer(prefetch_portal_services(services), many=True,
+                                                       context={'popular_services': [], 'is_customer_side': True,
+                                                                'store_id': self.store}).data
+
+        return data, len(context.captured_queries)
+
+    def test_query_count_does_not_grow_with_services(self):
+        self.create_services(2)
+        data, small_catalog_queries = self.serialize_services()
+        self.assertEqual(len(data), 2)
+
+        self.create_services(10)
+        data, large_catalog_queries = self.serialize_services()
+        self.assertEqual(len(data), 12)
+
+        self.assertEqual(small_catalog_queries, large_catalog_queries)
+
+    def test_portal_query_count_does_not_grow_with_services(self):
+        self.create_services(2)
+        data, small_catalog_queries = self.serialize_portal_services()
+        self.assertEqual(len(data), 2)
+
+        self.create_services(10)
+        data, large_catalog_queries = self.serialize_portal_services()
+        self.assertEqual(len(data), 12)
+
+        self.assertEqual(small_catalog_queries, large_catalog_queries)
+
+    def test_only_active_options_in_sequence_order(self):
+        self.create_services(1)
+        data = self.serialize_services()[0]
+
+        self.assertEqual([option['name'] for option in data[0]['options']], ["Size", "Metal"])
+        self.assertNotIn("field_labels", data[0]['options'][0])
+        self.assertEqual(len(data[0]['options'][0]['option_logic'][0]['rules']), 1)
+
+
+class CustomerPortalServiceDetailViewTestCase(TestCase):
+
+    def setUp(self):
+        self.store = create_store()
+        self.price_group = PriceGroup.objects.create(name="Retail")
+        service = Service.objects.create(name="Ring Resize", price=10, status=2)
+        ServiceOption.objects.create(service_id=service, name="Size", field_type=1, field_text1="", sequence=1)
+        self.price_group_service = PriceGroupService.objects.create(price_group_id=self.price_group,
+                                                                    service_id=service, price=10)
+        StorePriceGroupService.objects.create(store_id=self.store, price_group_service_id=self.price_group_service,
+                                              is_active=True, is_enabled=True)
+
+    def get(self, **headers):
+        path = "/api/v1/stores/{0}/portal-services/{1}".format(self.store.id, self.price_group_service.id)
+        request = APIRequestFactory().get(path, **headers)
+
+        return CustomerPortalServiceDetailView.as_view()(request, store_id=self.store.id,
+                                                         pk=self.price_group_service.id)
+
+    def test_service_detail(self):
+        response = self.get()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"Ring Resize", response.render().content)
+        self.assertIn("ETag", response)
+
+    def test_not_modified(self):
+        etag = self.get()['ETag']
+
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+class ServiceSoftDeleteTestCase(TestCase):
+
+    def test_delete_deactivates_price_list_copies_with_one_signal(self):
+        price_group = PriceGroup.objects.create(name="Retail")
+        service = Service.objects.create(name="Ring Resize", price=10, status=2)
+        PriceGroupService.objects.create(price_group_id=price_group, service_id=service, price=10)
+        sent = []
+
+        def receiver(sender, instance, counts, **kwargs):
+            sent.append((instance.pk, counts))
+
+        soft_deleted.connect(receiver, sender=Service)
+        self.addCleanup(soft_deleted.disconnect, receiver, sender=Service)
+
+        self.assertEqual(service.delete(), (2, {"services.Service": 1, "price_groups.PriceGroupService": 1}))
+        self.assertEqual(sent, [(service.pk, {"services.Service": 1, "price_groups.PriceGroupService": 1})])
+        self.assertFalse(Service.objects.get(pk=service.pk).is_active)
+        self.assertFalse(PriceGroupService.objects.filter(service_id=service, is_active=True).exists())
+
+class LocalPopularityCounterTestCase(TestCase):
+
+    def setUp(self):
+        self.store = create_store()
+        self.ring = Service.objects.create(name="Ring Resize", price=10, status=2)
+        self.chain = Service.objects.create(name="Chain Repair", price=20, status=2)
+        self.counter = LocalPopularityCounter()
+
+    def test_top_services_by_count(self):
+        PopularService.objects.create(store_id=self.store, service_id=self.chain, count=2)
+
+        self.counter.incr(self.store.id, [self.ring.id, self.ring.id, self.ring.id])
+
+        self.assertEqual(self.counter.top(self.store.id, 1), [self.ring.id, self.chain.id])
+        self.assertEqual(self.counter.top(self.store.id, 3), [self.ring.id])
+
+    def test_flush_is_taken_again_until_acked(self):
+        self.counter.incr(self.store.id, [self.ring.id])
+        flush_id, deltas = self.counter.take_deltas(self.store.id)
+
+        # counts after the take belong to the next flush
+        self.counter.incr(self.store.id, [self.chain.id])
+
+        self.assertEqual(self.counter.take_deltas(self.store.id), (flush_id, {self.ring.id: 1}))
+
+        self.counter.ack(self.store.id)
+        next_flush_id, deltas = self.counter.take_deltas(self.store.id)
+
+        self.assertNotEqual(next_flush_id, flush_id)
+        self.assertEqual(deltas, {self.chain.id: 1})
+
+    def test_flush_lock_is_exclusive(self):
+        lock = self.counter.flush_lock(self.store.id)
+
+        self.assertIsNotNone(lock)
+        self.assertIsNone(self.counter.flush_lock(self.store.id))
+
+        lock.release()
+        self.assertIsNotNone(self.counter.flush_lock(self.store.id))
+
+    def test_flush_persists_counts(self):
+        PopularService.objects.create(store_id=self.store, service_id=self.chain, count=2)
+
+        self.counter.incr(self.store.id, [self.ring.id, self.chain.id, self.chain.id])
+
+        self.assertEqual(flush_popular_service_counts(self.counter), 1)
+        self.assertEqual(dict(PopularService.objects.filter(store_id=self.store).values_list("service_id", "count")),
+                         {self.ring.id: 1, self.chain.id: 4})
+        self.assertEqual(self.counter.pending_stores(), [])
+
+    def test_flush_not_acked_is_applied_once(self):
+        self.counter.incr(self.store.id, [self.ring.id])
+        ack = self.counter.ack
+
+        # counts are committed but the flush is lost before the ack
+        self.counter.ack = lambda store_id: None
+        flush_popular_service_counts(self.counter)
+
+        self.counter.ack = ack
+        self.assertEqual(flush_popular_service_counts(self.counter), 0)
+
+        self.assertEqual(PopularService.objects.get(store_id=self.store, service_id=self.ring).count, 1)
+        self.assertEqual(self.counter.pending_stores(), [])
+
+
+class ServiceImportTestCase(TestCase):
+
+    def test_ndjson_rows(self):
+        stream = io.StringIO('{"name": "Ring Resize"}\n\n{"name": \n{"name": "Chain Repair"}\n')
+
+        rows = list(read_import_rows(stream, "ndjson"))
+
+        self.assertEqual([(row_number, data) for row_number, data, _ in rows],
+                         [(1, {"name": "Ring Resize"}), (3, None), (4, {"name": "Chain Repair"})])
+        self.assertIsNotNone(rows[1][2])
+
+    def test_csv_rows(self):
+        stream = io.StringIO('name,price,category_tags,price_list,options\n'
+                             'Ring Resize,10,Rings|Resize,1|2,"[{""name"": ""Size"", ""sequence"": 1}]"\n'
+                             'Chain Repair,,Chains,,\n')
+
+        rows = list(read_import_rows(stream, "csv"))
+
+        self.assertEqual(rows[0], (1, dict(name="Ring Resize", price="10", category_tags=["Rings", "Resize"],
+                                           price_list=["1", "2"], options=[{"name": "Size", "sequence": 1}]),
+                                   None))
+        self.assertEqual(rows[1], (2, dict(name="Chain Repair", category_tags=["Chains"], price_list=[],
+                                           options=[]), None))
+
+    def test_decode_error_stops_with_error_row(self):
+        # rows decoded before the bad byte are still read
+        lines = b"".join(json.dumps(dict(name="Ring {0}".format(n), sku="x" * 100)).encode() + b"\n"
+                         for n in range(200))
+        stream = io.TextIOWrapper(io.BytesIO(lines + b'{"name": "\xff"}\n'), encoding="utf-8")
+
+        rows = list(read_import_rows(stream, "ndjson"))
+        row_number, data, error = rows[-1]
+
+        self.assertGreater(len(rows), 1)
+        self.assertEqual(row_number, len(rows))
+        self.assertIsNone(data)
+        self.assertTrue(error.startswith(INVALID_IMPORT_FILE.format("")))
+        self.assertTrue(all(error is None for _, _, error in rows[:-1]))
+
+    def test_validate_chunk_reports_rows(self):
+        report = dict(created=0, service_ids=[], errors=[])
+        options = [dict(name="Size", field_type=1, sequence=1), dict(name="Metal", field_type=1, sequence=1)]
+        rows = [(1, None, "Invalid row: bad json"),
+                (2, dict(name="Ring Resize", price=10, category_tags=["Rings"], address_id=0, options=options),
+                 None),
+                (3, dict(name="Chain Repair", price=20, category_tags=["Chains"], address_id=0, price_list=[0]),
+                 None)]
+
+        self.assertEqual(validate_import_chunk(rows, report), [])
+
+        errors = {error['row']: error['errors'] for error in report['errors']}
+
+        self.assertEqual(errors[1], {'message': ["Invalid row: bad json"]})
+        self.assertIn("options", errors[2])
+        self.assertEqual(set(errors[3]), {"address_id", "price_list"})
+
+    @mock.patch("services.utils.service_import.validate_import_chunk")
+    @mock.patch("services.utils.service_import.write_import_chunk")
+    def test_failed_chunk_is_retried_per_row(self, write_import_chunk, validate_import_chunk):
+        def write(rows, user):
+            if any(data['name'] == "Bad" for _, data in rows):
+                raise ValueError("duplicate key")
+            return [row_number * 10 for row_number, _ in rows], []
+
+        validate_import_chunk.side_effect = lambda rows, report: [(row_number, data)
+                                                                  for row_number, data, _ in rows]
+        write_import_chunk.side_effect = write
+        stream = io.StringIO("\n".join(json.dumps(dict(name=name)) for name in ("Ring", "Bad", "Chain", "Clasp")))
+
+        report = import_services(stream, "ndjson", chunk_size=3)
+
+        self.assertEqual(report['created'], 3)
+        self.assertEqual(report['service_ids'], [10, 30, 40])
+        self.assertEqual(report['errors'], [dict(row=2, errors={'message': ["duplicate key"]})])
+
+    @mock.patch("services.utils.service_import.validate_import_chunk")
+    @mock.patch("services.utils.service_import.write_import_chunk")
+    def test_option_logic_errors_are_row_errors(self, write_import_chunk, validate_import_chunk):
+        errors = {'option_logic': [{'rules': [{'compare_option_field': ["Invalid compare option field 3."]}]}]}
+
+        def write(rows, user):
+            if any(data['name'] == "Bad" for _, data in rows):
+                raise ValidationError({row_number: errors for row_number, data in rows if data['name'] == "Bad"})
+            return [row_number * 10 for row_number, _ in rows], []
+
+        validate_import_chunk.side_effect = lambda rows, report: [(row_number, data)
+                                                                  for row_number, data, _ in rows]
+        write_import_chunk.side_effect = write
+        stream = io.StringIO("\n".join(json.dumps(dict(name=name)) for name in ("Ring", "Bad", "Chain")))
+
+        report = import_services(stream, "ndjson")
 
-# Create your tests here.
+        self.assertEqual(report['service_ids'], [10, 30])
+        self.assertEqual(report['errors'], [dict(row=2, errors=errors)])
+        self.assertEqual(write_import_chunk.call_count, 2)
@@ -3,6 +3,9 @@ from services.views.service import ServiceListCreateView, ServiceRetrieveUpdateD
     UpdateServiceOptionSequenceNumber
 from services.views.service_option import ServiceOptionDestroyView, ServiceOptionLogicDestroyView, \
     ServiceOptionImageDestroyView
+from services.views.option_logic import ServiceOptionVisibilityView
+from services.views.quote import StoreServiceQuoteView
+from services.views.service_import import ServiceImportView
 from services.views.search_service import CustomerPortalServiceView, CustomerPortalServiceDetailView
 from services.views.custom_service import CustomServiceListCreateView, CustomServiceRetrieveUpdateDeleteView
 from services.views.store_service import StoreServiceListView, StoreApproveVendorServicePriceView, \
@@ -12,6 +15,7 @@ urlpatterns = [
 
     path('api/v1/services', ServiceListCreateView.as_view(), name='service'),
     path('api/v1/services/<int:pk>', ServiceRetrieveUpdateDeleteView.as_view(), name='details_service'),
+    path('api/v1/services/import', ServiceImportView.as_view(), name='service_import'),
     path('api/v1/services/<int:service_id>/service-options/<int:pk>', ServiceOptionDestroyView.as_view(),
          name='details_service_option'),
 
@@ -19,11 +23,14 @@ urlpatterns = [
          name='delete_service_option_logic'),
     path('api/v1/services/<int:service_id>/service-option/<int:pk>/images/<int:image_id>',
          ServiceOptionImageDestroyView.as_view(), name='delete_service_option_image'),
+    path('api/v1/services/option-visibility', ServiceOptionVisibilityView.as_view(),
+         name='service_option_visibility'),
 
     # portal services
     path('api/v1/stores/<int:pk>/portal-services', CustomerPortalServiceView.as_view(), name='search_service'),
     path('api/v1/stores/<int:store_id>/portal-services/<int:pk>', CustomerPortalServiceDetailView.as_view(),
          name='get_single_store_service'),
+    path('api/v1/stores/<int:store_id>/quotes', StoreServiceQuoteView.as_view(), name='store_service_quote'),
 
     # custom services
     path('api/v1/custom/services', CustomServiceListCreateView.as_view(), name='custom_service'),
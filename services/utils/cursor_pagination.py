@@ -0,0 +1,84 @@
+import json
+import base64
+import binascii
+from django.db.models import Q
+
+INVALID_CURSOR = "Invalid cursor value."
+CURSOR_WITH_PAGE_NUMBER = "Cursor can not be combined with page."
+
+
+class KeysetPaginator(object):
+    """
+    Keyset (cursor) pagination over a fixed ordering, every page costs the same as the first one.
+    Ordering fields must end with a unique field, e.g. ("sequence", "id") or ("-rank", "id").
+    """
+
+    def __init__(self, ordering, page_size):
+        self.ordering = ordering
+        self.page_size = page_size
+
+    @staticmethod
+    def encode_cursor(values):
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def decode_cursor(self, cursor):
+        """
+        Decode opaque cursor token into the ordering values of the last row of the previous page
+        :param cursor:
+        :return:
+        """
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        except (ValueError, TypeError, binascii.Error):
+            raise ValueError(INVALID_CURSOR)
+
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise ValueError(INVALID_CURSOR)
+
+        # ordering values are plain scalars, nested lists or objects are never encoded
+        if not all(isinstance(value, (int, float, str)) and not isinstance(value, bool) for value in values):
+            raise ValueError(INVALID_CURSOR)
+
+        return values
+
+    def cursor_filter(self, values):
+        # rows after (v1, v2, ...): f1 > v1 or (f1 = v1 and f2 > v2) or ...
+        query = Q()
+        for idx, field in enumerate(self.ordering):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+
+            condition = Q(**{"{0}__{1}".format(name, lookup): values[idx]})
+            for prev_field, prev_value in zip(self.ordering[:idx], values[:idx]):
+                condition &= Q(**{prev_field.lstrip("-"): prev_value})
+
+            query |= condition
+
+        return query
+
+    def paginate(self, queryset, cursor=None):
+        """
+        Return page rows and cursor of the next page, None if it is the last page
+        :param queryset:
+        :param cursor: empty or None for the first page
+        :return:
+        """
+        queryset = queryset.order_by(*self.ordering)
+
+        if cursor:
+            values = self.decode_cursor(cursor)
+
+            try:
+                queryset = queryset.filter(self.cursor_filter(values))
+            except (TypeError, ValueError):
+                # value does not match the ordering field type
+                raise ValueError(INVALID_CURSOR)
+
+        rows = list(queryset[:self.page_size + 1])
+        next_cursor = None
+
+        if len(rows) > self.page_size:
+            rows = rows[:self.page_size]
+            next_cursor = self.encode_cursor([getattr(rows[-1], field.lstrip("-")) for field in self.ordering])
+
+        return rows, next_cursor
@@ -0,0 +1,118 @@
+import ast
+from functools import lru_cache
+
+# field types whose field_text1 holds option labels
+OPTION_LABEL_FIELD_TYPES = (5, 6, 10, 11)
+
+OPTION_LABEL_BATCH_SIZE = 500
+
+
+@lru_cache(maxsize=4096)
+def _literal_labels(field_text1):
+    return tuple(ast.literal_eval(field_text1).items())
+
+
+def parse_option_labels(field_text1):
+    """
+    Parse repr-string field_text1 ("{'label': 'value'}") to label dict, parsed values are cached per string
+    :param field_text1:
+    :return:
+    """
+    if not field_text1:
+        return {}
+
+    return dict(_literal_labels(field_text1))
+
+
+def split_option_labels(text):
+    """
+    Split csv option labels to label list
+    :param text:
+    :return:
+    """
+    return text.split(",")
+
+
+def get_option_labels(instance):
+    """
+    Ordered label list of service option, read from stored field_labels or field_text1 if not back filled
+    :param instance:
+    :return:
+    """
+    if instance.field_labels:
+        return instance.field_labels
+
+    return list(parse_option_labels(instance.field_text1).keys())
+
+
+def get_option_label_text(instance):
+    return ",".join(get_option_labels(instance))
+
+
+def compare_option_labels(old_labels, new_labels):
+    removed = set(old_labels.keys()) - set(new_labels.keys())
+    added = set(new_labels.keys()) - set(old_labels.keys())
+
+    return list(added), list(removed)
+
+
+def transform_option_labels(old_labels, new_labels):
+    """
+    Apply new service option labels to price list/store option labels, keeping costs of kept or renamed labels
+    :param old_labels: price list/store option label dict
+    :param new_labels: service option label dict
+    :return: repr-string field_text1
+    """
+    new_dict = {}
+    added, removed = compare_option_labels(old_labels, new_labels)
+
+    for key1, value1 in old_labels.items():
+        update_key = key1
+        update_value = value1
+
+        if key1 in removed:
+            for key2, value2 in new_labels.items():
+                if key2 in key1 and key2 not in old_labels:
+                    update_key = key2
+
+        new_dict[update_key] = update_value
+
+    for add_key in added:
+        if add_key not in new_dict:
+            new_dict[add_key] = ""
+
+    for del_key in removed:
+        if del_key in new_dict:
+            del new_dict[del_key]
+
+    return str(new_dict)
+
+
+def backfill_option_labels(apps, schema_editor=None):
+    """
+    Data migration to fill service option field_labels from field_text1
+    :param apps:
+    :param schema_editor:
+    :return:
+    """
+    service_option_model = apps.get_model('services', 'ServiceOption')
+    queryset = service_option_model.objects.filter(field_type__in=OPTION_LABEL_FIELD_TYPES, field_labels=[]) \
+        .exclude(field_text1="").only("id", "field_text1", "field_labels").order_by("id")
+
+    options = []
+    count = 0
+
+    for option in queryset.iterator(chunk_size=OPTION_LABEL_BATCH_SIZE):
+        option.field_labels = list(parse_option_labels(option.field_text1).keys())
+        options.append(option)
+
+        if len(options) >= OPTION_LABEL_BATCH_SIZE:
+            service_option_model.objects.bulk_update(options, ["field_labels"])
+            count += len(options)
+            options = []
+
+    if options:
+        service_option_model.objects.bulk_update(options, ["field_labels"])
+        count += len(options)
+
+    return count
@@ -0,0 +1,257 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from common_config.api_message import INVALID_SERVICE_OPTION_LOGIC_COMPARE_FIELD_VALUE
+
+from services.models.service_option import ServiceOption
+from services.models.service_option_logic import ServiceOptionAction, ServiceOptionRule
+
+# compiled option logic decision table per service
+OPTION_LOGIC_KEY = "service_option_logic:{0}"
+
+# compiled tables are dropped on every logic change, the timeout only bounds entries of unused services
+OPTION_LOGIC_TIMEOUT = getattr(settings, "SERVICE_OPTION_LOGIC_CACHE_TIMEOUT", 60 * 60 * 24)
+
+INVALID_OPTION_LOGIC_SERVICE = "Service {0} is not available."
+
+
+def get_option_logic_key(service_id):
+    return OPTION_LOGIC_KEY.format(service_id)
+
+
+def compile_service_option_logic(service_id):
+    """
+    Compile service option actions and rules into a decision table and keep it in the cache
+    decision table: {"options": [option id, ...],
+                     "actions": [(apply to option id, action, conditional join,
+                                  ((compare option id, operator type, compare to), ...)), ...]}
+    :param service_id:
+    :return:
+    """
+    options = list(ServiceOption.objects.filter(service_id=service_id, is_active=True)
+                   .order_by("sequence", "id").values_list("id", flat=True))
+
+    actions = ServiceOptionAction.objects.filter(apply_to_option_id__in=options).prefetch_related("rules") \
+        .order_by("id")
+
+    table = dict(options=options, actions=[
+        (action.apply_to_option_id_id, action.action, action.conditional_join,
+         tuple((rule.compare_option_field_id, rule.operator_type, rule.compare_to) for rule in action.rules.all()))
+        for action in actions])
+
+    cache.set(get_option_logic_key(service_id), table, OPTION_LOGIC_TIMEOUT)
+
+    return table
+
+
+def get_service_option_logic(service_id):
+    table = cache.get(get_option_logic_key(service_id))
+
+    if table is None:
+        table = compile_service_option_logic(service_id)
+
+    return table
+
+
+def invalidate_service_option_logic(service_ids):
+    cache.delete_many([get_option_logic_key(service_id) for service_id in service_ids])
+
+
+def compile_missing_service_option_logic(service_ids):
+    # compile only services whose decision table is not compiled yet
+    for service_id in service_ids:
+        if cache.get(get_option_logic_key(service_id)) is None:
+            compile_service_option_logic(service_id)
+
+
+def recompile_option_logic(service_ids):
+    """
+    Drop compiled option logic of services and compile it again once the transaction is committed
+    :param service_ids:
+    :return:
+    """
+    service_ids = set(service_ids)
+    invalidate_service_option_logic(service_ids)
+    transaction.on_commit(lambda: compile_missing_service_option_logic(service_ids))
+
+
+REMOVE_OPTION_RULES_SQL = """
+    WITH option_actions AS (
+        SELECT id FROM {actions} WHERE apply_to_option_id = %s
+        UNION
+        SELECT option_action_id FROM {rules} WHERE compare_option_field = %s
+    )
+    DELETE FROM {rules} WHERE option_action_id IN (SELECT id FROM option_actions)
+    RETURNING option_action_id
+"""
+
+REMOVE_OPTION_ACTIONS_SQL = "DELETE FROM {actions} WHERE apply_to_option_id = %s OR id = ANY(%s)"
+
+CLEAR_OPTION_RULES_SQL = """
+    DELETE FROM {rules} WHERE option_action_id IN (SELECT id FROM {actions} WHERE apply_to_option_id = ANY(%s))
+"""
+
+CLEAR_OPTION_ACTIONS_SQL = "DELETE FROM {actions} WHERE apply_to_option_id = ANY(%s)"
+
+
+def clear_option_logic(option_ids):
+    """
+    Delete actions applied to options and their rules in two deletes, without post_delete signals, callers
+    recompile the service logic once
+    :param option_ids:
+    :return: {"actions": removed actions count, "rules": removed rules count}
+    """
+    actions_table = connection.ops.quote_name(ServiceOptionAction._meta.db_table)
+    rules_table = connection.ops.quote_name(ServiceOptionRule._meta.db_table)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(CLEAR_OPTION_RULES_SQL.format(actions=actions_table, rules=rules_table), [list(option_ids)])
+        removed = dict(rules=cursor.rowcount)
+
+        cursor.execute(CLEAR_OPTION_ACTIONS_SQL.format(actions=actions_table), [list(option_ids)])
+        removed['actions'] = cursor.rowcount
+
+    return removed
+
+
+def remove_option_logic(option):
+    """
+    Remove all actions and rules touching option, as apply target or compare field, in two deletes and
+    invalidate the service compiled logic
+    :param option: service option instance
+    :return: {"actions": removed actions count, "rules": removed rules count}
+    """
+    actions_table = connection.ops.quote_name(ServiceOptionAction._meta.db_table)
+    rules_table = connection.ops.quote_name(ServiceOptionRule._meta.db_table)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(REMOVE_OPTION_RULES_SQL.format(actions=actions_table, rules=rules_table),
+                       [option.id, option.id])
+        action_ids = [row[0] for row in cursor.fetchall()]
+        removed = dict(rules=len(action_ids))
+
+        cursor.execute(REMOVE_OPTION_ACTIONS_SQL.format(actions=actions_table), [option.id, list(set(action_ids))])
+        removed['actions'] = cursor.rowcount
+
+    # deletes skip post_delete signals
+    invalidate_service_option_logic([option.service_id_id])
+    transaction.on_commit(lambda: compile_missing_service_option_logic([option.service_id_id]))
+
+    return removed
+
+
+def create_logic_query(logic_query, conditional_join, operator_type, compare_to, is_last):
+    """
+    :param logic_query:
+    :param conditional_join:
+    :param operator_type:
+    :param compare_to:
+    :param is_last:
+    :return:
+    """
+    conditional_join_reg = {'all': 'and', 'none': 'and', 'one': 'or'}
+    logic_query = "{0} compare_option_field {1} '{2}'".format(logic_query, operator_type, compare_to)
+
+    if not is_last:
+        logic_query = "{0} {1}".format(logic_query, conditional_join_reg[conditional_join])
+    return logic_query
+
+
+def build_service_option_rules(rules, option_sequence_mapping, action_instance):
+    """
+    Build unsaved action rules and the action conditional logic, rules refer saved options by sequence number
+    :param rules:
+    :param option_sequence_mapping: {sequence: saved service option}
+    :param action_instance:
+    :return: rule instances and rule errors
+    """
+    logic_query = "where "
+    is_last = False
+    errors = []
+    rule_instances = []
+
+    for idx, rule in enumerate(rules, start=1):
+        rule['option_action_id'] = action_instance
+        rule_error = {}
+
+        # validate service option sequence number with compare_option_field if not match raise error message
+        if rule['compare_option_field'] not in option_sequence_mapping:
+            rule_error.setdefault("compare_option_field", []).append(
+                INVALID_SERVICE_OPTION_LOGIC_COMPARE_FIELD_VALUE.format(rule['compare_option_field']))
+            errors.append(rule_error)
+            continue
+
+        # replace database id to sequence number
+        rule['compare_option_field'] = option_sequence_mapping[rule['compare_option_field']]
+
+        rule_instances.append(ServiceOptionRule(**rule))
+
+        if len(rules) == idx:
+            is_last = True
+
+        # create option logic query
+        logic_query = create_logic_query(logic_query, action_instance.conditional_join,
+                                         rule['operator_type'], rule['compare_to'], is_last)
+
+    action_instance.conditional_logic = logic_query
+
+    return rule_instances, errors
+
+
+def match_rule(answer, operator_type, compare_to):
+    if answer is None or answer == "" or answer == []:
+        return False
+
+    values = answer if isinstance(answer, (list, tuple)) else [answer]
+    values = [str(value).strip() for value in values]
+
+    if operator_type == "=":
+        return compare_to in values
+
+    if operator_type == "!=":
+        return compare_to not in values
+
+    if operator_type == "contains":
+        return any(compare_to.lower() in value.lower() for value in values)
+
+    try:
+        number, compare_number = float(values[0]), float(compare_to)
+    except ValueError as err:
+        return False
+
+    return {
+        ">": number > compare_number,
+        "<": number < compare_number,
+        ">=": number >= compare_number,
+        "<=": number <= compare_number,
+    }.get(operator_type, False)
+
+
+def evaluate_service_option_logic(table, answers):
+    """
+    Return visible option ids of a service for customer answers
+    :param table: compiled decision table
+    :param answers: {option id: answer value or list of values}
+    :return:
+    """
+    answers = {int(option_id): value for option_id, value in answers.items()}
+    visible = set(table['options'])
+
+    for apply_to_option_id, action, conditional_join, rules in table['actions']:
+        matches = [match_rule(answers.get(option_id), operator_type, compare_to)
+                   for option_id, operator_type, compare_to in rules]
+
+        if conditional_join == "all":
+            condition = all(matches)
+        elif conditional_join == "one":
+            condition = any(matches)
+        else:
+            condition = not any(matches)
+
+        if (action == "show") == condition:
+            visible.add(apply_to_option_id)
+        else:
+            visible.discard(apply_to_option_id)
+
+    return [option_id for option_id in table['options'] if option_id in visible]
@@ -0,0 +1,239 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from price_groups.models.price_group_service_option import PriceGroupServiceOption
+from services.models.service_option_outbox import ServiceOptionChangeOutbox
+from services.utils.option_labels import parse_option_labels, transform_option_labels, OPTION_LABEL_FIELD_TYPES
+
+# price list service options rewritten per transaction
+OPTION_PROPAGATION_CHUNK_SIZE = getattr(settings, "SERVICE_OPTION_PROPAGATION_CHUNK_SIZE", 500)
+
+# failed changes are retried until they used all attempts
+OPTION_PROPAGATION_MAX_ATTEMPTS = getattr(settings, "SERVICE_OPTION_PROPAGATION_MAX_ATTEMPTS", 10)
+
+# a processing change without chunk progress for this many seconds belongs to a lost job
+OPTION_PROPAGATION_LEASE = getattr(settings, "SERVICE_OPTION_PROPAGATION_LEASE", 60 * 30)
+
+
+def queue_service_option_changes(price_list_payloads):
+    """
+    Record service option changes to propagate to price list and store options, jobs are queued on commit
+    :param price_list_payloads: {service option id: (service option instance, payload, image ids or None)}
+    :return: outbox rows
+    """
+    outbox_rows = []
+    created_on = timezone.now()
+
+    for option_id, (instance, payload, images) in price_list_payloads.items():
+        payload = dict(payload)
+
+        if "field_text1" in payload and instance.field_type in OPTION_LABEL_FIELD_TYPES:
+            # keep label order, jsonb does not keep object key order
+            payload['labels'] = list(payload.pop('field_text1').keys())
+
+        if images is not None:
+            payload['images'] = images
+
+        outbox_rows.append(ServiceOptionChangeOutbox(service_option_id=instance, payload=payload, updated_on=created_on))
+
+    ServiceOptionChangeOutbox.objects.bulk_create(outbox_rows)
+
+    def dispatch():
+        # tasks import this module
+        from services.tasks import propagate_service_option_change_task
+
+        # changes which wait for an older change of their option are skipped by the job
+        for outbox in outbox_rows:
+            propagate_service_option_change_task.delay(outbox.id)
+
+    transaction.on_commit(dispatch)
+
+    return outbox_rows
+
+
+def claimable_changes(now=None):
+    """
+    Return outbox changes a job may claim: pending or failed changes with attempts left and processing
+    changes whose job stopped reporting progress
+    :param now:
+    :return:
+    """
+    now = now or timezone.now()
+    lease_expired_on = now - timedelta(seconds=OPTION_PROPAGATION_LEASE)
+
+    return ServiceOptionChangeOutbox.objects.filter(
+        Q(status__in=[1, 4]) | Q(status=2, updated_on__lt=lease_expired_on),
+        attempts__lt=OPTION_PROPAGATION_MAX_ATTEMPTS)
+
+
+def unfinished_changes(service_option_id):
+    # changes of an option which are not completed and still have attempts left
+    return ServiceOptionChangeOutbox.objects.filter(service_option_id=service_option_id, status__in=[1, 2, 4],
+                                                    attempts__lt=OPTION_PROPAGATION_MAX_ATTEMPTS)
+
+
+def claim_service_option_change(outbox_id):
+    """
+    Lock an outbox change and mark it as processing by this job
+    :param outbox_id:
+    :return: outbox row, None if it is locked or processed by another job, completed, out of attempts or waits for
+             an older change of the same option
+    """
+    now = timezone.now()
+
+    with transaction.atomic():
+        outbox = claimable_changes(now).select_for_update(skip_locked=True).filter(pk=outbox_id).first()
+
+        if outbox is None:
+            return None
+
+        # changes of one option are applied in id order, a newer change never runs before an older one
+        if unfinished_changes(outbox.service_option_id_id).filter(id__lt=outbox.id).exists():
+            return None
+
+        outbox.status = 2
+        outbox.attempts += 1
+        outbox.updated_on = now
+
+        if outbox.total_count is None:
+            outbox.total_count = PriceGroupServiceOption.objects.filter(
+                service_option_id=outbox.service_option_id_id).count()
+
+        outbox.save(update_fields=["status", "attempts", "total_count", "updated_on"])
+
+    return outbox
+
+
+def set_price_group_service_option_images(option_ids, image_ids):
+    """
+    Replace images of price list service options in one delete and one insert
+    :param option_ids:
+    :param image_ids:
+    :return:
+    """
+    field = PriceGroupServiceOption._meta.get_field('images')
+    through_model = field.remote_field.through
+    option_column = "{0}_id".format(field.m2m_field_name())
+    image_column = "{0}_id".format(field.m2m_reverse_field_name())
+
+    # un-reference all old data
+    through_model.objects.filter(**{"{0}__in".format(option_column): option_ids}).delete()
+
+    links = [through_model(**{option_column: option_id, image_column: image_id})
+             for option_id in option_ids for image_id in image_ids]
+
+    if len(links) > 0:
+        # add/update price group service option images
+        through_model.objects.bulk_create(links)
+
+
+def propagate_option_labels(chunk, labels):
+    """
+    Rewrite labels of price list options and their store option clones, costs of kept labels are preserved
+    :param chunk: price list service options
+    :param labels: ordered service option labels
+    :return:
+    """
+    new_labels = {label: "" for label in labels}
+    label_options = [option for option in chunk if option.field_type in OPTION_LABEL_FIELD_TYPES]
+
+    if len(label_options) <= 0:
+        return
+
+    for option in label_options:
+        option.field_text1 = transform_option_labels(parse_option_labels(option.field_text1), new_labels)
+
+    PriceGroupServiceOption.objects.bulk_update(label_options, ['field_text1'])
+
+    # update all store service option
+    store_option_rel = PriceGroupServiceOption._meta.get_field('store_service_option')
+    store_option_model = store_option_rel.related_model
+    store_options = list(store_option_model.objects.filter(
+        **{"{0}__in".format(store_option_rel.field.name): [option.id for option in label_options]})
+        .only("id", "field_text1"))
+
+    for store_option in store_options:
+        store_option.field_text1 = transform_option_labels(parse_option_labels(store_option.field_text1), new_labels)
+
+    if len(store_options) > 0:
+        store_option_model.objects.bulk_update(store_options, ['field_text1'])
+
+
+def process_service_option_change(outbox_id, chunk_size=OPTION_PROPAGATION_CHUNK_SIZE, progress=None):
+    """
+    Claim and propagate one outbox change chunk by chunk, every chunk commits with the outbox progress so retries
+    resume after the last committed chunk
+    :param outbox_id:
+    :param chunk_size:
+    :param progress: callable(processed_count, total_count)
+    :return: outbox row, None if the change is not claimed by this job
+    """
+    outbox = claim_service_option_change(outbox_id)
+
+    if outbox is None:
+        return None
+
+    payload = dict(outbox.payload)
+    labels = payload.pop('labels', None)
+    images = payload.pop('images', None)
+    queryset = PriceGroupServiceOption.objects.filter(service_option_id=outbox.service_option_id_id)
+
+    while True:
+        with transaction.atomic():
+            # the claim is lost once the lease expired and another job claimed the change
+            if not ServiceOptionChangeOutbox.objects.select_for_update().filter(
+                    pk=outbox.id, status=2, attempts=outbox.attempts).exists():
+                return None
+
+            chunk = list(queryset.filter(id__gt=outbox.last_processed_id).order_by("id")
+                         .only("id", "field_type", "field_text1")[:chunk_size])
+
+            if len(chunk) <= 0:
+                outbox.status = 3
+                outbox.updated_on = timezone.now()
+                outbox.save(update_fields=["status", "updated_on"])
+                dispatch_next_service_option_change(outbox.service_option_id_id)
+                break
+
+            chunk_ids = [option.id for option in chunk]
+
+            if len(payload) > 0:
+                # same values for every price list option of the chunk
+                PriceGroupServiceOption.objects.filter(id__in=chunk_ids).update(**payload)
+
+            if labels is not None:
+                propagate_option_labels(chunk, labels)
+
+            if images is not None:
+                set_price_group_service_option_images(chunk_ids, images)
+
+            outbox.last_processed_id = chunk_ids[-1]
+            outbox.processed_count += len(chunk)
+            outbox.updated_on = timezone.now()
+            outbox.save(update_fields=["last_processed_id", "processed_count", "updated_on"])
+
+        if progress is not None:
+            progress(outbox.processed_count, outbox.total_count)
+
+    return outbox
+
+
+def dispatch_next_service_option_change(service_option_id):
+    """
+    Queue the oldest unfinished change of an option once the current transaction is committed
+    :param service_option_id:
+    :return:
+    """
+    def dispatch():
+        # tasks import this module
+        from services.tasks import propagate_service_option_change_task
+
+        outbox_id = unfinished_changes(service_option_id).order_by("id").values_list("id", flat=True).first()
+
+        if outbox_id is not None:
+            propagate_service_option_change_task.delay(outbox_id)
+
+    transaction.on_commit(dispatch)
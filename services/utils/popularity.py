@@ -0,0 +1,288 @@
+import abc
+import uuid
+import threading
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from services.models.popular_service import PopularService
+from services.models.popular_service_flush import PopularServiceFlush
+from services.utils.portal_catalog import bump_portal_popularity_version
+
+# sorted set of total popular service counts per store
+POPULAR_SERVICE_KEY = "popular_services:{0}"
+
+# hash of service counts per store which are not persisted yet
+POPULAR_SERVICE_DELTA_KEY = "popular_services:delta:{0}"
+POPULAR_SERVICE_FLUSH_KEY = "popular_services:flush:{0}"
+POPULAR_SERVICE_FLUSH_ID_KEY = "popular_services:flush_id:{0}"
+
+# lock of a running flush per store, expires if the flushing worker dies
+POPULAR_SERVICE_FLUSH_LOCK_KEY = "popular_services:flush_lock:{0}"
+POPULAR_SERVICE_FLUSH_TIMEOUT = 60 * 5
+
+# set of store ids with pending counts
+POPULAR_SERVICE_PENDING_KEY = "popular_services:pending"
+
+
+class BasePopularityCounter(abc.ABC):
+    """
+    Popular service counter, counts are kept per store and persisted by flush_popular_service_counts
+    """
+
+    def load_store_counts(self, store_id):
+        return PopularService.objects.filter(store_id=store_id).values_list("service_id", "count")
+
+    @abc.abstractmethod
+    def incr(self, store_id, service_ids):
+        pass
+
+    @abc.abstractmethod
+    def top(self, store_id, min_count):
+        pass
+
+    @abc.abstractmethod
+    def pending_stores(self):
+        pass
+
+    @abc.abstractmethod
+    def flush_lock(self, store_id):
+        """
+        Try to lock store counts for a flush
+        :param store_id:
+        :return: lock to release, None if another flush holds it
+        """
+
+    @abc.abstractmethod
+    def take_deltas(self, store_id):
+        """
+        Move pending counts of a store into its flush, a flush which is not acked is returned again
+        :param store_id:
+        :return: flush id, {service id: count}
+        """
+
+    @abc.abstractmethod
+    def ack(self, store_id):
+        pass
+
+
+class LocalPopularityCounter(BasePopularityCounter):
+    """
+    In-process counter, stand-in of the redis counter for tests and local development
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.totals = {}
+        self.deltas = {}
+        self.flushing = {}
+        self.flush_locks = {}
+
+    def _totals(self, store_id):
+        with self.lock:
+            if store_id not in self.totals:
+                self.totals[store_id] = dict(self.load_store_counts(store_id))
+            return self.totals[store_id]
+
+    def incr(self, store_id, service_ids):
+        totals = self._totals(store_id)
+
+        with self.lock:
+            deltas = self.deltas.setdefault(store_id, {})
+            for service_id in service_ids:
+                totals[service_id] = totals.get(service_id, 0) + 1
+                deltas[service_id] = deltas.get(service_id, 0) + 1
+
+    def top(self, store_id, min_count):
+        totals = self._totals(store_id)
+
+        with self.lock:
+            return [service_id for service_id, count in sorted(totals.items(), key=lambda k_v: k_v[1], reverse=True)
+                    if count >= min_count]
+
+    def pending_stores(self):
+        with self.lock:
+            return list(set(self.deltas.keys()) | set(self.flushing.keys()))
+
+    def flush_lock(self, store_id):
+        with self.lock:
+            lock = self.flush_locks.setdefault(store_id, threading.Lock())
+
+        return lock if lock.acquire(blocking=False) else None
+
+    def take_deltas(self, store_id):
+        with self.lock:
+            if store_id not in self.flushing:
+                self.flushing[store_id] = (uuid.uuid4().hex, self.deltas.pop(store_id, {}))
+
+            flush_id, deltas = self.flushing[store_id]
+            return flush_id, dict(deltas)
+
+    def ack(self, store_id):
+        with self.lock:
+            self.flushing.pop(store_id, None)
+
+
+class RedisPopularityCounter(BasePopularityCounter):
+    """
+    Redis counter, one sorted set of totals and one hash of pending counts per store
+    """
+
+    # load store totals only when the sorted set does not exist, in one atomic step
+    LOAD_SCRIPT = """
+    if redis.call('exists', KEYS[1]) == 0 then
+        redis.call('zadd', KEYS[1], unpack(ARGV))
+    end
+    return 1
+    """
+
+    def __init__(self):
+        from django_redis import get_redis_connection
+        self.redis = get_redis_connection("default")
+        self.load_script = self.redis.register_script(self.LOAD_SCRIPT)
+
+    def _load(self, store_id):
+        key = POPULAR_SERVICE_KEY.format(store_id)
+
+        if not self.redis.exists(key):
+            args = []
+            for service_id, count in self.load_store_counts(store_id):
+                args.extend([count, service_id])
+
+            if args:
+                self.load_script(keys=[key], args=args)
+        return key
+
+    def incr(self, store_id, service_ids):
+        key = self._load(store_id)
+        delta_key = POPULAR_SERVICE_DELTA_KEY.format(store_id)
+
+        pipe = self.redis.pipeline()
+        for service_id in service_ids:
+            pipe.zincrby(key, 1, service_id)
+            pipe.hincrby(delta_key, service_id, 1)
+        pipe.sadd(POPULAR_SERVICE_PENDING_KEY, store_id)
+        pipe.execute()
+
+    def top(self, store_id, min_count):
+        key = self._load(store_id)
+        return [int(service_id) for service_id in self.redis.zrevrangebyscore(key, "+inf", min_count)]
+
+    def pending_stores(self):
+        return [int(store_id) for store_id in self.redis.smembers(POPULAR_SERVICE_PENDING_KEY)]
+
+    def flush_lock(self, store_id):
+        lock = self.redis.lock(POPULAR_SERVICE_FLUSH_LOCK_KEY.format(store_id), timeout=POPULAR_SERVICE_FLUSH_TIMEOUT)
+        return lock if lock.acquire(blocking=False) else None
+
+    def take_deltas(self, store_id):
+        delta_key = POPULAR_SERVICE_DELTA_KEY.format(store_id)
+        flush_key = POPULAR_SERVICE_FLUSH_KEY.format(store_id)
+        flush_id_key = POPULAR_SERVICE_FLUSH_ID_KEY.format(store_id)
+
+        self.redis.srem(POPULAR_SERVICE_PENDING_KEY, store_id)
+
+        # a left over flush key belongs to a failed flush, retry it with its flush id before taking new counts
+        if not self.redis.exists(flush_key):
+            if not self.redis.exists(delta_key):
+                return None, {}
+
+            # counts and flush id move together, increments only ever add to the delta key
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.rename(delta_key, flush_key)
+            pipe.set(flush_id_key, uuid.uuid4().hex)
+            pipe.execute()
+        elif self.redis.exists(delta_key):
+            self.redis.sadd(POPULAR_SERVICE_PENDING_KEY, store_id)
+
+        self.redis.set(flush_id_key, uuid.uuid4().hex, nx=True)
+        flush_id = self.redis.get(flush_id_key).decode()
+
+        return flush_id, {int(service_id): int(count) for service_id, count in self.redis.hgetall(flush_key).items()}
+
+    def ack(self, store_id):
+        self.redis.delete(POPULAR_SERVICE_FLUSH_KEY.format(store_id), POPULAR_SERVICE_FLUSH_ID_KEY.format(store_id))
+
+
+_counter = None
+
+
+def get_popularity_counter():
+    """
+    Return configured popular service counter, POPULAR_SERVICE_COUNTER setting is "redis" or "local"
+    :return:
+    """
+    global _counter
+
+    if _counter is None:
+        backend = getattr(settings, "POPULAR_SERVICE_COUNTER", "redis")
+        _counter = RedisPopularityCounter() if backend == "redis" else LocalPopularityCounter()
+
+    return _counter
+
+
+def apply_popular_service_counts(store_id, flush_id, deltas):
+    """
+    Add flushed counts to the store popular services, a flush id which is already applied is skipped
+    :param store_id:
+    :param flush_id:
+    :param deltas: {service id: count}
+    :return: True if counts are applied
+    """
+    deltas = dict(deltas)
+
+    with transaction.atomic():
+        flush, created = PopularServiceFlush.objects.select_for_update().get_or_create(
+            store_id_id=store_id, defaults=dict(flush_id=flush_id))
+
+        if not created:
+            if flush.flush_id == flush_id:
+                # committed before the previous flush was acked
+                return False
+
+            flush.flush_id = flush_id
+            flush.save(update_fields=["flush_id", "updated_on"])
+
+        popular_services = list(PopularService.objects.select_for_update().filter(
+            store_id=store_id, service_id__in=list(deltas.keys())))
+
+        for popular_service in popular_services:
+            popular_service.count = F("count") + deltas.pop(popular_service.service_id_id)
+
+        PopularService.objects.bulk_update(popular_services, ["count"])
+        PopularService.objects.bulk_create([PopularService(store_id_id=store_id, service_id_id=service_id,
+                                                           count=count)
+                                            for service_id, count in deltas.items()])
+
+    return True
+
+
+def flush_popular_service_counts(counter=None):
+    """
+    Persist pending popular service counts, one bulk update and one bulk insert per store
+    :param counter:
+    :return:
+    """
+    counter = counter or get_popularity_counter()
+    flushed = 0
+
+    for store_id in counter.pending_stores():
+        lock = counter.flush_lock(store_id)
+
+        if lock is None:
+            # another flush of the store is running
+            continue
+
+        try:
+            flush_id, deltas = counter.take_deltas(store_id)
+
+            if deltas and apply_popular_service_counts(store_id, flush_id, deltas):
+                # popular service flags of the store portal changed
+                bump_portal_popularity_version([store_id])
+                flushed += 1
+
+            counter.ack(store_id)
+        finally:
+            lock.release()
+
+    return flushed
@@ -0,0 +1,325 @@
+import time
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+from django.utils.http import http_date, quote_etag
+
+from common_config.constant import SERVICE_CATEGORY, ITEM_CATEGORY
+from common_config.models.category import Category
+from common_config.serializers.category import CategorySerializer
+from common_config.logger.logging_handler import logger
+from price_groups.models.price_group import StorePriceGroup
+from price_groups.models.price_group_service import PriceGroupService, StorePriceGroupService
+from stores.models.store import Store
+from stores.utils.store_context import store_context_cache
+from services.models.popular_service import PopularService
+from services.utils.query_plan import prefetch_portal_services
+
+# cache key of the pre-built store portal catalog, one entry per response variant
+PORTAL_CATALOG_KEY = "portal_catalog:{0}:{1}"
+
+# lock key which de-duplicates queued rebuilds of the same store catalog
+PORTAL_CATALOG_REBUILD_KEY = "portal_catalog_rebuild:{0}"
+PORTAL_CATALOG_REBUILD_TIMEOUT = 60 * 10
+
+# response variants (is_customer_side, is_partial) served from the snapshot
+PORTAL_CATALOG_VARIANTS = ((False, False), (False, True), (True, False), (True, True))
+
+# store catalog version, timestamp of the last change of any row which feeds the portal payload
+PORTAL_CATALOG_VERSION_KEY = "portal_catalog_version:{0}"
+
+# store popularity version, timestamp of the last flush of popular service counts
+PORTAL_POPULARITY_VERSION_KEY = "portal_popularity_version:{0}"
+
+# query params that still describe an unfiltered portal load
+PORTAL_CATALOG_PARAMS = ("is_customer_side", "is_partial")
+
+# popular service flags in the snapshot are refreshed at least once per timeout
+PORTAL_CATALOG_TIMEOUT = getattr(settings, "PORTAL_CATALOG_CACHE_TIMEOUT", 60 * 60 * 24)
+
+
+def get_portal_catalog_variant(params):
+    """
+    Return the snapshot variant for request query params, None if the request is filtered
+    :param params:
+    :return:
+    """
+    if not all(key in PORTAL_CATALOG_PARAMS for key in params.keys()):
+        return None
+
+    return "is_customer_side" in params, params.get("is_partial") == "true"
+
+
+def get_portal_catalog_key(store_id, variant):
+    is_customer_side, is_partial = variant
+    return PORTAL_CATALOG_KEY.format(store_id, "{0:d}{1:d}".format(is_customer_side, is_partial))
+
+
+def get_portal_catalog(store_id, variant):
+    catalog = cache.get(get_portal_catalog_key(store_id, variant))
+
+    # snapshots stored before catalog versions were tagged are rebuilt
+    if catalog is None or len(catalog) != 3:
+        return None
+
+    # snapshot must be built from the current catalog rows and the last flushed popular counts
+    version, popularity_version, data = catalog
+
+    if version != get_portal_catalog_version(store_id) or \
+            popularity_version != get_portal_popularity_version(store_id):
+        return None
+
+    return data
+
+
+def set_portal_catalog(store_id, variant, data, version, popularity_version):
+    cache.set(get_portal_catalog_key(store_id, variant), (version, popularity_version, data),
+              PORTAL_CATALOG_TIMEOUT)
+
+
+def delete_portal_catalog(store_ids):
+    cache.delete_many([get_portal_catalog_key(store_id, variant) for store_id in store_ids
+                       for variant in PORTAL_CATALOG_VARIANTS])
+
+
+def get_service_store_ids(service_ids):
+    """
+    Return ids of the stores whose portal catalog contains any of the given services
+    :param service_ids:
+    :return:
+    """
+    return set(StorePriceGroupService.objects.filter(
+        price_group_service_id__service_id__in=service_ids).values_list("store_id", flat=True).distinct())
+
+
+def acquire_portal_catalog_rebuild(store_id):
+    """
+    Mark store portal catalog rebuild as queued, return False if it is already queued
+    :param store_id:
+    :return:
+    """
+    return cache.add(PORTAL_CATALOG_REBUILD_KEY.format(store_id), True, PORTAL_CATALOG_REBUILD_TIMEOUT)
+
+
+def release_portal_catalog_rebuild(store_id):
+    cache.delete(PORTAL_CATALOG_REBUILD_KEY.format(store_id))
+
+
+def get_portal_catalog_version(store_id):
+    key = PORTAL_CATALOG_VERSION_KEY.format(store_id)
+    version = cache.get(key)
+
+    if version is None:
+        # unknown version, start a new one
+        cache.add(key, time.time(), None)
+        version = cache.get(key)
+
+    return version
+
+
+def bump_portal_catalog_version(store_ids):
+    now = time.time()
+    cache.set_many({PORTAL_CATALOG_VERSION_KEY.format(store_id): now for store_id in store_ids}, None)
+
+
+def get_portal_popularity_version(store_id):
+    return cache.get(PORTAL_POPULARITY_VERSION_KEY.format(store_id), 0)
+
+
+def bump_portal_popularity_version(store_ids):
+    now = time.time()
+    cache.set_many({PORTAL_POPULARITY_VERSION_KEY.format(store_id): now for store_id in store_ids}, None)
+
+
+def refresh_portal_catalog(store_ids):
+    """
+    Once the transaction is committed drop the store portal catalog snapshots, bump the catalog
+    versions and queue the snapshot rebuild
+    :param store_ids:
+    :return:
+    """
+    store_ids = set(store_ids)
+
+    if len(store_ids) <= 0:
+        return
+
+    def rebuild():
+        # tasks import this module
+        from services.tasks import build_store_portal_catalog_task
+
+        # readers must not see the new version before the changed rows are committed
+        delete_portal_catalog(store_ids)
+        bump_portal_catalog_version(store_ids)
+
+        for store_id in store_ids:
+            if acquire_portal_catalog_rebuild(store_id):
+                build_store_portal_catalog_task.delay(store_id)
+
+    transaction.on_commit(rebuild)
+
+
+def get_portal_catalog_validators(store_id, full_path):
+    """
+    Return ETag and Last-Modified header values of a store portal response
+    :param store_id:
+    :param full_path: request path with query string, each filter has its own ETag
+    :return:
+    """
+    version = get_portal_catalog_version(store_id)
+    popularity_version = get_portal_popularity_version(store_id)
+    path_hash = hashlib.md5(full_path.encode()).hexdigest()[:12]
+
+    return quote_etag("{0}-{1:.6f}-{2:.6f}-{3}".format(store_id, version, popularity_version, path_hash)), \
+        http_date(max(version, popularity_version))
+
+
+def get_store_services(store_context):
+    """
+    Return store enabled price group service ids as a sub query, evaluated inside the database
+    :param store_context:
+    :return:
+    """
+    # active and enabled services of the store price group
+    price_group_services = PriceGroupService.objects.filter(price_group_id=store_context.price_group_id,
+                                                            service_id__is_active=True,
+                                                            service_id__status=2).values("id")
+
+    return StorePriceGroupService.objects.filter(price_group_service_id__in=price_group_services,
+                                                 store_id=store_context.id,
+                                                 is_active=True,
+                                                 is_enabled=True).values("price_group_service_id")
+
+
+def get_portal_services(store_context):
+    """
+    Return unfiltered price group services of the store portal
+    :param store_context:
+    :return:
+    """
+    return PriceGroupService.objects.filter(service_id__status=2, is_enabled=True,
+                                            id__in=get_store_services(store_context))
+
+
+def get_popular_services(store_id, count):
+    try:
+        return PopularService.objects.filter(store_id=store_id, count__gte=count).order_by("count").reverse()
+    except Exception as err:
+        logger.error("Un-excepted error %s", err.args[0])
+    return []
+
+
+def get_portal_service_data(queryset, store_obj, popular_services, is_partial=False):
+    """
+    Serialize portal services with the portal query plan
+    :param queryset:
+    :param store_obj:
+    :param popular_services:
+    :param is_partial:
+    :return:
+    """
+    # price group serializers import the signal receivers, which import this module
+    from price_groups.serializers.price_group_service import CustomerPortalServiceViewSerializer, \
+        CustomerPortalServicePartialDataListSerializer
+
+    if is_partial:
+        serializer_class = CustomerPortalServicePartialDataListSerializer
+    else:
+        serializer_class = CustomerPortalServiceViewSerializer
+
+    # load services, options, images, option logic and tags with the portal query plan
+    queryset = prefetch_portal_services(queryset)
+
+    return serializer_class(queryset, many=True, context={'popular_services': popular_services,
+                                                          'is_customer_side': True,
+                                                          'store_id': store_obj}).data
+
+
+def get_portal_facets(service_ids, entity_type, related_name):
+    """
+    Category facets of filtered services with number of services per facet
+    :param service_ids: price group service id sub query
+    :param entity_type:
+    :param related_name: category reverse relation name of the service tag field
+    :return:
+    """
+    price_group_services = "{0}__price_group_services".format(related_name)
+
+    facets = Category.objects.filter(**{"entity_type": entity_type, price_group_services + "__in": service_ids}) \
+        .annotate(service_count=Count(price_group_services, distinct=True)).order_by("sequence", "id")
+
+    # serialized category as in the service payload, with the number of matching services
+    return {facet.id: dict(CategorySerializer(facet).data, service_count=facet.service_count) for facet in facets}
+
+
+def group_portal_services(queryset, data, store_context):
+    """
+    Group serialized portal services by category with item and category facets
+    :param queryset:
+    :param data:
+    :param store_context:
+    :return:
+    """
+    service_ids = queryset.order_by().values("id")
+    insurance = dict(store_context.insurance) if store_context.insurance is not None else dict()
+
+    # sorted item and categories facets
+    categories = get_portal_facets(service_ids, SERVICE_CATEGORY, "category_tags")
+    item_tags = get_portal_facets(service_ids, ITEM_CATEGORY, "item_tags")
+
+    # price group service and category pairs
+    service_categories = {}
+    for category_id, service_id in PriceGroupService.objects.filter(
+            id__in=service_ids, service_id__category_tags__entity_type=SERVICE_CATEGORY) \
+            .values_list("service_id__category_tags", "id"):
+        service_categories.setdefault(service_id, []).append(category_id)
+
+    # group services by category id, keep service order
+    category_services = {}
+    for iii in data:
+        for category_id in service_categories.get(iii['id'], []):
+            category_services.setdefault(category_id, []).append(iii)
+
+    # sort service group
+    service_group = {}
+    for category_id, category in categories.items():
+        if category_id in category_services:
+            service_group.setdefault(category['name'].strip(), []).extend(category_services[category_id])
+
+    return dict(services=service_group, item_tags=item_tags, categories=categories, insurance=insurance)
+
+
+def build_portal_catalog(store_context, variant, store_obj=None):
+    """
+    Build the unfiltered store portal catalog and keep it in the catalog snapshot cache
+    :param store_context:
+    :param variant:
+    :param store_obj: store of the serializer context, loaded when not given
+    :return:
+    """
+    is_customer_side, is_partial = variant
+
+    if store_obj is None:
+        store_obj = Store.objects.get(pk=store_context.id)
+
+    # versions are read before the rows, changes committed while the catalog is built belong to the next snapshot
+    version = get_portal_catalog_version(store_context.id)
+    popularity_version = get_portal_popularity_version(store_context.id)
+    popular_services = get_popular_services(store_context.id, store_context.settings['popular_service_count'])
+
+    queryset = get_portal_services(store_context)
+    data = get_portal_service_data(queryset, store_obj, popular_services, is_partial)
+
+    if is_customer_side:
+        data = group_portal_services(queryset, data, store_context)
+
+    # context cached by this worker may predate a price list change, such a catalog is not stored
+    if not StorePriceGroup.objects.filter(store_id=store_context.id,
+                                          price_group_id=store_context.price_group_id).exists():
+        store_context_cache.invalidate(store_context.id)
+        return data
+
+    set_portal_catalog(store_context.id, variant, data, version, popularity_version)
+
+    return data
@@ -0,0 +1,132 @@
+from django.contrib.postgres.aggregates import JSONBAgg
+from django.contrib.postgres.fields import JSONField
+from django.db.models import Prefetch, QuerySet, prefetch_related_objects, Func, F, Value, OuterRef, Subquery
+
+from common_config.constant import SERVICE_CATEGORY, ITEM_CATEGORY
+from common_config.models.category import Category
+from price_groups.models.price_group_service import PriceGroupService
+from services.models.service_option import ServiceOption
+from services.models.service_option_logic import ServiceOptionAction
+
+# search documents and sort keys which are stored on the service row but never serialized
+SERVICE_LIST_DEFERRED_FIELDS = ("search_vector", "portal_search_vector", "status_rank")
+
+
+def service_prefetches(prefix=""):
+    """
+    Prefetch objects of service options, images, option logic rules and tags
+    :param prefix: lookup path to the service, e.g. "service_id__" for price group services
+    :return:
+    """
+    options = ServiceOption.objects.filter(is_active=True).order_by("sequence").prefetch_related(
+        "images", Prefetch("option_logic", queryset=ServiceOptionAction.objects.prefetch_related("rules")))
+
+    return [
+        Prefetch(prefix + "options", queryset=options, to_attr="active_options"),
+        prefix + "images",
+        Prefetch(prefix + "category_tags", queryset=Category.objects.filter(entity_type=SERVICE_CATEGORY)),
+        Prefetch(prefix + "item_tags", queryset=Category.objects.filter(entity_type=ITEM_CATEGORY)),
+    ]
+
+
+def prefetch_services(services):
+    """
+    Load services with all serialized relations in a fixed number of queries
+    :param services: service queryset or list of service objects
+    :return:
+    """
+    if isinstance(services, QuerySet):
+        return services.defer(*SERVICE_LIST_DEFERRED_FIELDS).prefetch_related(*service_prefetches())
+
+    prefetch_related_objects(services, *service_prefetches())
+    return services
+
+
+def service_list_prefetches():
+    # images and tags of the admin service list, tags filtered by their entity type
+    return [
+        "images",
+        Prefetch("category_tags", queryset=Category.objects.filter(entity_type=SERVICE_CATEGORY)),
+        Prefetch("item_tags", queryset=Category.objects.filter(entity_type=ITEM_CATEGORY)),
+    ]
+
+
+def prefetch_service_list(services, include_description=False):
+    """
+    Load admin service list rows in a fixed number of queries
+    :param services: service queryset
+    :param include_description: load large description text
+    :return:
+    """
+    services = services.defer(*SERVICE_LIST_DEFERRED_FIELDS).prefetch_related(*service_list_prefetches())
+
+    if not include_description:
+        services = services.defer("description")
+
+    return services
+
+
+def prefetch_portal_services(services):
+    """
+    Load price group services of the customer portal listing in a fixed number of queries
+    :param services: price group service queryset or list of price group service objects
+    :return:
+    """
+    if isinstance(services, QuerySet):
+        return services.select_related("service_id") \
+            .defer(*["service_id__" + field for field in SERVICE_LIST_DEFERRED_FIELDS]) \
+            .prefetch_related(*service_prefetches("service_id__"))
+
+    prefetch_related_objects(services, "service_id", *service_prefetches("service_id__"))
+    return services
+
+
+def price_list_aggregate():
+    # [{"id": price group id, "name": price group name}, ...] of active price group services
+    return JSONBAgg(Func(Value("id"), F("price_group_id"), Value("name"), F("price_group_id__name"),
+                         function="jsonb_build_object", output_field=JSONField()), ordering="price_group_id")
+
+
+def price_list_subquery():
+    return Subquery(PriceGroupService.objects.filter(service_id=OuterRef("pk"), is_active=True)
+                    .order_by().values("service_id").annotate(price_list=price_list_aggregate())
+                    .values("price_list")[:1], output_field=JSONField())
+
+
+def prefetch_service_detail(services):
+    """
+    Load service detail with address, price list, active options, images, logic and tags in a fixed number
+    of queries
+    :param services: service queryset
+    :return:
+    """
+    return services.select_related("address_id").annotate(price_list_data=price_list_subquery()) \
+        .prefetch_related(*service_prefetches())
+
+
+def load_service_detail(service):
+    """
+    Load service detail relations on a service object already in memory, e.g. after create or update
+    :param service:
+    :return:
+    """
+    # drop relations cached before the save
+    service.__dict__.pop("active_options", None)
+    service._prefetched_objects_cache = {}
+
+    prefetch_related_objects([service], *service_prefetches())
+
+    service.price_list_data = PriceGroupService.objects.filter(service_id=service.id, is_active=True) \
+        .aggregate(price_list=price_list_aggregate())['price_list']
+
+    return service
+
+
+def get_active_options(service):
+    # use prefetched active options if service is loaded with the query plan
+    options = getattr(service, "active_options", None)
+
+    if options is None:
+        options = service.options.filter(is_active=True).order_by("sequence")
+
+    return options
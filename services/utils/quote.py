@@ -0,0 +1,100 @@
+from decimal import Decimal, InvalidOperation
+from django.core.cache import cache
+
+from price_groups.models.price_group_service_option import PriceGroupServiceOption
+from services.utils.option_labels import parse_option_labels, OPTION_LABEL_FIELD_TYPES
+from services.utils.portal_catalog import get_portal_catalog_version, get_portal_services, PORTAL_CATALOG_TIMEOUT
+
+# store price table, keyed by catalog version so any catalog change builds a new table
+STORE_PRICE_TABLE_KEY = "store_price_table:{0}:{1:.6f}"
+
+INVALID_QUOTE_SERVICE = "Service {0} is not available in this store."
+
+
+def to_decimal(value):
+    try:
+        return Decimal(str(value).strip() or 0)
+    except InvalidOperation as err:
+        return Decimal(0)
+
+
+def build_store_price_table(store_context):
+    """
+    Price table of the services listed in the store portal and their option costs
+    {price group service id: {"price": Decimal, "options": {service option id: {label: Decimal}}}}
+    :param store_context:
+    :return:
+    """
+    table = {}
+
+    # same visibility as the portal listing, active price list rows only
+    store_services = get_portal_services(store_context).filter(is_active=True).values_list("id", "price")
+
+    for price_group_service_id, price in store_services:
+        table[price_group_service_id] = dict(price=price, options={})
+
+    options = PriceGroupServiceOption.objects.filter(price_group_service_id__in=list(table.keys()), is_active=True,
+                                                     service_option_id__is_option_cost=True,
+                                                     field_type__in=OPTION_LABEL_FIELD_TYPES) \
+        .values_list("price_group_service_id", "service_option_id", "field_text1")
+
+    for price_group_service_id, service_option_id, field_text1 in options:
+        labels = parse_option_labels(field_text1)
+        table[price_group_service_id]['options'][service_option_id] = {
+            label: to_decimal(value) for label, value in labels.items()}
+
+    return table
+
+
+def get_store_price_table(store_context):
+    key = STORE_PRICE_TABLE_KEY.format(store_context.id, get_portal_catalog_version(store_context.id))
+    table = cache.get(key)
+
+    if table is None:
+        table = build_store_price_table(store_context)
+        cache.set(key, table, PORTAL_CATALOG_TIMEOUT)
+
+    return table
+
+
+def quote_store_services(store_context, items):
+    """
+    Price configured store services
+    :param store_context:
+    :param items: [{"price_group_service_id": id, "quantity": n, "options": {service option id: label(s)}}],
+                  option ids are validated by QuoteItemSerializer
+    :return: quote lines, quote total and errors by item index
+    """
+    table = get_store_price_table(store_context)
+    lines = []
+    errors = {}
+    total = Decimal(0)
+
+    for idx, item in enumerate(items):
+        service = table.get(item['price_group_service_id'], None)
+
+        if service is None:
+            errors[idx] = {'price_group_service_id': [INVALID_QUOTE_SERVICE.format(item['price_group_service_id'])]}
+            continue
+
+        option_price = Decimal(0)
+
+        for option_id, value in item['options'].items():
+            costs = service['options'].get(int(option_id), None)
+
+            if costs is None:
+                # option without cost
+                continue
+
+            for label in (value if isinstance(value, (list, tuple)) else [value]):
+                option_price += costs.get(str(label), Decimal(0))
+
+        unit_price = service['price'] + option_price
+        line_total = unit_price * item['quantity']
+        total += line_total
+
+        lines.append(dict(price_group_service_id=item['price_group_service_id'], quantity=item['quantity'],
+                          price=service['price'], option_price=option_price, unit_price=unit_price,
+                          total=line_total))
+
+    return lines, total, errors
@@ -0,0 +1,81 @@
+from django.conf import settings
+from django.db import connection, transaction
+
+from price_groups.models.price_group_service_option import PriceGroupServiceOption
+from services.models.service import Service
+from services.models.service_option import ServiceOption
+
+# services resequenced per transaction
+RESEQUENCE_BATCH_SIZE = getattr(settings, "SERVICE_OPTION_RESEQUENCE_BATCH_SIZE", 500)
+
+RESEQUENCE_OPTIONS_SQL = """
+    UPDATE {options} AS option SET sequence = ranked.row_number
+    FROM (
+        SELECT id, ROW_NUMBER() OVER (PARTITION BY service_id ORDER BY id) AS row_number
+        FROM {options} WHERE service_id = ANY(%s)
+    ) AS ranked
+    WHERE option.id = ranked.id AND option.sequence <> ranked.row_number
+    RETURNING option.service_id
+"""
+
+RESEQUENCE_PRICE_LIST_OPTIONS_SQL = """
+    UPDATE {price_list_options} AS price_list_option SET sequence = option.sequence
+    FROM {options} AS option
+    WHERE price_list_option.{option_column} = option.id AND option.service_id = ANY(%s)
+        AND price_list_option.sequence <> option.sequence
+    RETURNING option.service_id
+"""
+
+
+def resequence_service_options(service_ids):
+    """
+    Number options of services 1..n by id and copy the numbers to price list options, only rows with a
+    different sequence are written so re-runs are no-ops
+    :param service_ids:
+    :return: changed service ids, service ids of updated price list options, updated price list options count
+    """
+    options_table = connection.ops.quote_name(ServiceOption._meta.db_table)
+    price_list_options_table = connection.ops.quote_name(PriceGroupServiceOption._meta.db_table)
+    option_column = connection.ops.quote_name(PriceGroupServiceOption._meta.get_field('service_option_id').column)
+    service_ids = list(service_ids)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(RESEQUENCE_OPTIONS_SQL.format(options=options_table), [service_ids])
+        changed_service_ids = {row[0] for row in cursor.fetchall()}
+
+        cursor.execute(RESEQUENCE_PRICE_LIST_OPTIONS_SQL.format(
+            price_list_options=price_list_options_table, options=options_table, option_column=option_column),
+            [service_ids])
+        price_list_rows = cursor.fetchall()
+
+    return changed_service_ids, {row[0] for row in price_list_rows}, len(price_list_rows)
+
+
+def resequence_all_service_options(service_id=None, batch_size=RESEQUENCE_BATCH_SIZE, progress=None):
+    """
+    Resequence options of one service or of all services in batches of services
+    :param service_id:
+    :param batch_size:
+    :param progress: callable(processed services, total services)
+    :return: changed service ids, service ids of updated price list options, updated price list options count
+    """
+    queryset = Service.objects.all()
+
+    if service_id is not None:
+        queryset = queryset.filter(id=service_id)
+
+    all_service_ids = list(queryset.order_by("id").values_list("id", flat=True))
+    changed_service_ids = set()
+    price_list_service_ids = set()
+    price_list_count = 0
+
+    for idx in range(0, len(all_service_ids), batch_size):
+        changed, price_list_changed, count = resequence_service_options(all_service_ids[idx:idx + batch_size])
+        changed_service_ids.update(changed)
+        price_list_service_ids.update(price_list_changed)
+        price_list_count += count
+
+        if progress is not None:
+            progress(min(idx + batch_size, len(all_service_ids)), len(all_service_ids))
+
+    return changed_service_ids, price_list_service_ids, price_list_count
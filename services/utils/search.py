@@ -0,0 +1,73 @@
+import re
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchVector, SearchQuery
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from common_config.constant import SERVICE_CATEGORY, ITEM_CATEGORY
+from common_config.models.category import Category
+from services.models.service import Service
+
+# text search configuration of the service search documents
+SEARCH_CONFIG = 'english'
+
+# minimum trigram similarity of a fuzzy service name match
+TRIGRAM_SIMILARITY_THRESHOLD = getattr(settings, 'SERVICE_NAME_SIMILARITY_THRESHOLD', 0.3)
+
+
+def tag_names(related_name, entity_type):
+    """
+    Sub query expression which returns all service tag names as a single text
+    :param related_name: category reverse relation name of the service tag field
+    :param entity_type:
+    :return:
+    """
+    names = Category.objects.filter(**{related_name: OuterRef('pk')}, entity_type=entity_type) \
+        .values(related_name).annotate(names=StringAgg('name', delimiter=' ')).values('names')
+
+    return Coalesce(Subquery(names), Value(''))
+
+
+def portal_search_document():
+    """
+    Weighted portal search document, service name, category tags and item tags
+    :return:
+    """
+    return SearchVector('name', weight='A', config=SEARCH_CONFIG) + \
+        SearchVector(tag_names('category_tags', SERVICE_CATEGORY), weight='B', config=SEARCH_CONFIG) + \
+        SearchVector(tag_names('item_tags', ITEM_CATEGORY), weight='C', config=SEARCH_CONFIG)
+
+
+def admin_search_document():
+    """
+    Weighted admin search document, service name, category tags and description
+    :return:
+    """
+    return SearchVector('name', weight='A', config=SEARCH_CONFIG) + \
+        SearchVector(tag_names('category_tags', SERVICE_CATEGORY), weight='B', config=SEARCH_CONFIG) + \
+        SearchVector(Coalesce('description', Value('')), weight='C', config=SEARCH_CONFIG)
+
+
+def update_service_search_vectors(service_ids):
+    """
+    Rebuild portal and admin search vectors of the given services in a single update query
+    :param service_ids: list of service ids or service id sub query
+    :return:
+    """
+    return Service.objects.filter(id__in=service_ids).update(portal_search_vector=portal_search_document(),
+                                                             search_vector=admin_search_document())
+
+
+def search_query(text):
+    """
+    Prefix match search query of all words in search text, None if text has no searchable word
+    :param text:
+    :return:
+    """
+    words = re.findall(r"\w+", text)
+
+    if len(words) <= 0:
+        return None
+
+    return SearchQuery(" & ".join("{0}:*".format(word) for word in words), search_type='raw', config=SEARCH_CONFIG)
@@ -0,0 +1,368 @@
+import copy
+import csv
+import json
+from itertools import islice
+from django.conf import settings
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from common_config.api_message import INVALID_ADDRESS_ID, INVALID_SERVICE_OPTION_LOGIC_APPLY_OPTION_FIELD_ID
+from common_config.logger.logging_handler import logger
+from common_config.constant import DEFAULT_WARRANTY_METADATA, SERVICE_CATEGORY, ITEM_CATEGORY
+from addresses.models.admin_address import AdminAddress
+from price_groups.models.price_group import PriceGroup
+from price_groups.tasks.store_service import linked_services_to_store_task
+from price_groups.utils.price_list_service import add_or_update_price_list_services
+from services.models.service import Service
+from services.models.service_option import ServiceOption
+from services.models.service_option_logic import ServiceOptionAction, ServiceOptionRule
+from services.serializers.service_import import ServiceImportSerializer
+from services.utils.option_logic import build_service_option_rules
+from services.utils.option_labels import split_option_labels, OPTION_LABEL_FIELD_TYPES
+from services.utils.search import update_service_search_vectors
+from services.utils.tags import resolve_tags
+
+# import rows validated and written per transaction
+SERVICE_IMPORT_CHUNK_SIZE = getattr(settings, "SERVICE_IMPORT_CHUNK_SIZE", 200)
+
+# csv list columns separator
+CSV_LIST_SEPARATOR = "|"
+
+INVALID_IMPORT_ROW = "Invalid row: {0}"
+INVALID_IMPORT_FILE = "Invalid file, import stopped: {0}"
+INVALID_PRICE_LIST_ID = "Invalid price list id {0}."
+UNSUPPORTED_IMPORT_FORMAT = "Unsupported import format {0}, use ndjson or csv."
+
+IMPORT_FORMATS = ("ndjson", "csv")
+
+
+def read_stream_rows(rows):
+    """
+    Number raw stream rows, decoding and csv errors are raised while iterating so they end the import with an
+    error row instead of failing after earlier chunks are written
+    :param rows: line or csv row iterable
+    :return: (row number, row, file error)
+    """
+    rows = iter(rows)
+    row_number = 0
+
+    while True:
+        row_number += 1
+
+        try:
+            row = next(rows)
+        except StopIteration:
+            return
+        except (UnicodeDecodeError, csv.Error) as err:
+            yield row_number, None, INVALID_IMPORT_FILE.format(err)
+            return
+
+        yield row_number, row, None
+
+
+def read_ndjson_rows(stream):
+    for row_number, line, error in read_stream_rows(stream):
+        if error is not None:
+            yield row_number, None, error
+            continue
+
+        if not line.strip():
+            continue
+
+        try:
+            yield row_number, json.loads(line), None
+        except ValueError as err:
+            yield row_number, None, INVALID_IMPORT_ROW.format(err)
+
+
+def read_csv_rows(stream):
+    """
+    One service per csv row, tag and price list columns are "|" separated, options column holds a json array
+    :param stream:
+    :return:
+    """
+    for row_number, row, error in read_stream_rows(csv.DictReader(stream)):
+        if error is not None:
+            yield row_number, None, error
+            continue
+
+        try:
+            for column in ("category_tags", "item_tags", "price_list"):
+                if column in row:
+                    row[column] = [value for value in (row[column] or "").split(CSV_LIST_SEPARATOR) if value]
+
+            row['options'] = json.loads(row['options']) if row.get('options') else []
+
+            yield row_number, {key: value for key, value in row.items() if value != ""}, None
+        except ValueError as err:
+            yield row_number, None, INVALID_IMPORT_ROW.format(err)
+
+
+def read_import_rows(stream, file_format):
+    if file_format == "csv":
+        return read_csv_rows(stream)
+
+    return read_ndjson_rows(stream)
+
+
+def validate_import_chunk(rows, report):
+    """
+    Validate chunk rows, address and price list ids are checked with one query each
+    :param rows: [(row number, data, parse error)]
+    :param report:
+    :return: [(row number, validated data)]
+    """
+    valid_rows = []
+
+    for row_number, data, error in rows:
+        if error is not None:
+            report['errors'].append(dict(row=row_number, errors={'message': [error]}))
+            continue
+
+        serializer = ServiceImportSerializer(data=data)
+
+        if not serializer.is_valid():
+            report['errors'].append(dict(row=row_number, errors=serializer.errors))
+            continue
+
+        valid_rows.append((row_number, serializer.validated_data))
+
+    address_ids = set(AdminAddress.objects.filter(id__in={data['address_id'] for _, data in valid_rows})
+                      .values_list("id", flat=True))
+    price_groups = PriceGroup.objects.in_bulk({price_list_id for _, data in valid_rows
+                                               for price_list_id in data['price_list']})
+
+    checked_rows = []
+
+    for row_number, data in valid_rows:
+        errors = {}
+
+        if data['address_id'] not in address_ids:
+            errors.setdefault("address_id", []).append(INVALID_ADDRESS_ID.format(data['address_id']))
+
+        for price_list_id in data['price_list']:
+            if price_list_id not in price_groups:
+                errors.setdefault("price_list", []).append(INVALID_PRICE_LIST_ID.format(price_list_id))
+
+        if errors:
+            report['errors'].append(dict(row=row_number, errors=errors))
+            continue
+
+        data['price_list'] = [price_groups[price_list_id] for price_list_id in data['price_list']]
+        checked_rows.append((row_number, data))
+
+    return checked_rows
+
+
+def build_import_option(option, service, user):
+    if "field_text1" in option and option['field_type'] in OPTION_LABEL_FIELD_TYPES:
+        label_list = split_option_labels(option['field_text1'])
+        option['field_text1'] = str({label: "" for label in label_list})
+        option['field_labels'] = label_list
+
+    if "meta_data" not in option and option['field_type'] in [12]:
+        option['meta_data'] = DEFAULT_WARRANTY_METADATA
+
+    return ServiceOption(service_id=service, created_by=user, **option)
+
+
+def link_import_tags(services_tags, related_name, entity_type):
+    """
+    Resolve tag names of all chunk services at once and link them in one through table insert
+    :param services_tags: [(service, tag names)]
+    :param related_name:
+    :param entity_type:
+    :return:
+    """
+    tags = resolve_tags([name for _, names in services_tags for name in names], entity_type)
+
+    field = Service._meta.get_field(related_name)
+    through_model = field.remote_field.through
+    service_column = "{0}_id".format(field.m2m_field_name())
+    tag_column = "{0}_id".format(field.m2m_reverse_field_name())
+
+    through_model.objects.bulk_create([
+        through_model(**{service_column: service.id, tag_column: tag_id})
+        for service, names in services_tags for tag_id in {tag_id for name in names for tag_id in tags[name]}])
+
+
+def write_import_chunk(rows, user):
+    """
+    Write validated chunk rows with one bulk create per table, row data is consumed
+    :param rows: [(row number, validated data)]
+    :param user:
+    :return: (service ids, price group service ids)
+    :raise ValidationError: {row number: errors} of rows with invalid option logic, nothing is written
+    """
+    services = []
+    price_group_service_ids = []
+
+    for row_number, data in rows:
+        options = data.pop('options')
+        category_tags = data.pop('category_tags')
+        item_tags = data.pop('item_tags')
+        price_list = data.pop('price_list')
+        address_id = data.pop('address_id')
+
+        service = Service(created_by=user, address_id_id=address_id, **data)
+        # bulk create skips save
+        service.status_rank = Service.STATUS_RANKS.get(service.status, len(Service.STATUS_RANKS))
+        services.append((service, options, category_tags, item_tags, price_list))
+
+    # create services, ids are returned by postgres
+    Service.objects.bulk_create([service for service, *_ in services])
+
+    link_import_tags([(service, names) for service, _, names, _, _ in services], 'category_tags', SERVICE_CATEGORY)
+    link_import_tags([(service, names) for service, _, _, names, _ in services], 'item_tags', ITEM_CATEGORY)
+
+    option_instances = []
+    service_options = []
+
+    for (row_number, _), (service, options, *_) in zip(rows, services):
+        option_sequence_mapping = {}
+        option_logic_rules = []
+
+        for option in options:
+            option_logic = option.pop('option_logic', None)
+            instance = build_import_option(option, service, user)
+            option_instances.append(instance)
+            option_sequence_mapping[instance.sequence] = instance
+
+            if option_logic is not None:
+                option_logic_rules.append(option_logic)
+
+        service_options.append((row_number, option_sequence_mapping, option_logic_rules))
+
+    ServiceOption.objects.bulk_create(option_instances)
+
+    # logic refers options by sequence
+    action_rules = []
+    row_errors = {}
+
+    for row_number, option_sequence_mapping, option_logic_rules in service_options:
+        errors = {}
+
+        for option_logics in option_logic_rules:
+            for action in option_logics:
+                rules = action.pop("rules")
+
+                if action['apply_to_option_id'] not in option_sequence_mapping:
+                    errors.setdefault("apply_to_option_id", []).append(
+                        INVALID_SERVICE_OPTION_LOGIC_APPLY_OPTION_FIELD_ID.format(action['apply_to_option_id']))
+                    continue
+
+                action['apply_to_option_id'] = option_sequence_mapping[action['apply_to_option_id']]
+                action_instance = ServiceOptionAction(**action)
+                rule_instances, rule_errors = build_service_option_rules(rules, option_sequence_mapping,
+                                                                         action_instance)
+                action_rules.append((action_instance, rule_instances))
+
+                if rule_errors:
+                    errors.setdefault("rules", []).extend(rule_errors)
+
+        if errors:
+            row_errors[row_number] = {'option_logic': [errors]}
+
+    if row_errors:
+        # rolled back by the caller, the other rows are written again
+        raise ValidationError(row_errors)
+
+    ServiceOptionAction.objects.bulk_create([action_instance for action_instance, _ in action_rules])
+
+    rule_instances = []
+
+    for action_instance, rules in action_rules:
+        # rules were built before the action had an id
+        for rule in rules:
+            rule.option_action_id_id = action_instance.pk
+        rule_instances.extend(rules)
+
+    ServiceOptionRule.objects.bulk_create(rule_instances)
+
+    # bulk create skips post_save signals
+    update_service_search_vectors([service.id for service, *_ in services])
+
+    for service, _, _, _, price_list in services:
+        if len(price_list) > 0:
+            # add price list
+            price_group_service_ids.extend(add_or_update_price_list_services(price_list, service, user, True))
+
+    return [service.id for service, *_ in services], price_group_service_ids
+
+
+def write_import_rows(rows, user, report):
+    """
+    Write chunk in one transaction, a failed chunk is retried row by row in savepoints so only the failing rows
+    are reported
+    :param rows: [(row number, validated data)]
+    :param user:
+    :param report:
+    :return: price group service ids
+    """
+    if len(rows) <= 0:
+        return []
+
+    try:
+        with transaction.atomic():
+            # chunk write consumes row data, keep rows for the retry
+            written = [write_import_chunk(copy.deepcopy(rows), user)]
+    except ValidationError as err:
+        # report rows with invalid option logic and write the rest of the chunk again
+        report['errors'].extend(dict(row=row_number, errors=errors) for row_number, errors in err.detail.items())
+        return write_import_rows([(row_number, data) for row_number, data in rows if row_number not in err.detail],
+                                 user, report)
+    except Exception as err:
+        logger.error("Service import chunk failed, retrying rows :  %s.", err)
+        written = []
+
+        for row_number, data in rows:
+            try:
+                with transaction.atomic():
+                    written.append(write_import_chunk([(row_number, data)], user))
+            except ValidationError as row_err:
+                report['errors'].append(dict(row=row_number, errors=row_err.detail[row_number]))
+            except Exception as row_err:
+                report['errors'].append(dict(row=row_number, errors={'message': [str(row_err)]}))
+
+    price_group_service_ids = []
+
+    for service_ids, row_price_group_service_ids in written:
+        report['created'] += len(service_ids)
+        report['service_ids'].extend(service_ids)
+        price_group_service_ids.extend(row_price_group_service_ids)
+
+    return price_group_service_ids
+
+
+def import_services(stream, file_format, user=None, chunk_size=SERVICE_IMPORT_CHUNK_SIZE):
+    """
+    Stream services with nested options, logic and tag names from ndjson or csv, every chunk is validated and
+    written in its own transaction and invalid rows are reported without stopping the import
+    :param stream: text stream
+    :param file_format: ndjson or csv
+    :param user: created by user
+    :param chunk_size:
+    :return: import report {"created": count, "service_ids": [...], "errors": [{"row": n, "errors": {...}}]}
+    """
+    report = dict(created=0, service_ids=[], errors=[])
+    price_group_service_ids = []
+    rows = read_import_rows(stream, file_format)
+
+    while True:
+        chunk = list(islice(rows, chunk_size))
+
+        if len(chunk) <= 0:
+            break
+
+        valid_rows = validate_import_chunk(chunk, report)
+
+        if len(valid_rows) <= 0:
+            continue
+
+        price_group_service_ids.extend(write_import_rows(valid_rows, user, report))
+
+    if price_group_service_ids:
+        # system user assign imported services to store, once per import
+        linked_services_to_store_task.delay({'priceGroupServiceIdList': price_group_service_ids})
+
+    return report
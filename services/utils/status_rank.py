@@ -0,0 +1,20 @@
+from django.db.models import Case, When, Value
+
+from services.models.service import Service
+
+
+def status_rank_expression():
+    return Case(*[When(status=status, then=Value(rank)) for status, rank in Service.STATUS_RANKS.items()],
+                default=Value(len(Service.STATUS_RANKS)))
+
+
+def backfill_status_rank(apps, schema_editor=None):
+    """
+    Data migration to fill service status_rank from status in one update
+    :param apps:
+    :param schema_editor:
+    :return:
+    """
+    service_model = apps.get_model('services', 'Service')
+
+    return service_model.objects.update(status_rank=status_rank_expression())
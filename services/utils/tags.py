@@ -0,0 +1,63 @@
+from django.dispatch import Signal
+
+from common_config.models.category import Category
+from services.models.service import Service
+
+# sent with instance and changes {related_name: (added category ids, removed category ids)} when service tags change
+service_tags_changed = Signal()
+
+
+def normalize_tag_name(name):
+    return " ".join(name.split()).lower()
+
+
+def resolve_tags(names, entity_type):
+    """
+    Get or create categories of all tag names with one Category.get_or_create_categories call, categories are
+    mapped back to the names trimmed and case-insensitive
+    :param names:
+    :param entity_type:
+    :return: {name: set of category ids}
+    """
+    names = list(dict.fromkeys(names))
+
+    if len(names) <= 0:
+        return {}
+
+    category_ids = {}
+    for category in Category.get_or_create_categories(names, entity_type):
+        category_ids.setdefault(normalize_tag_name(category.name), set()).add(category.id)
+
+    return {name: category_ids.get(normalize_tag_name(name), set()) for name in names}
+
+
+def sync_service_tags(service, related_name, names, entity_type):
+    """
+    Write only the difference between current and requested service tags to the through table
+    :param service:
+    :param related_name: category_tags or item_tags
+    :param names:
+    :param entity_type:
+    :return: added and removed category ids
+    """
+    field = Service._meta.get_field(related_name)
+    through_model = field.remote_field.through
+    service_column = "{0}_id".format(field.m2m_field_name())
+    tag_column = "{0}_id".format(field.m2m_reverse_field_name())
+
+    current_ids = set(through_model.objects.filter(**{service_column: service.id})
+                      .values_list(tag_column, flat=True))
+    tag_ids = {category.id for category in Category.get_or_create_categories(names, entity_type)} \
+        if len(names) > 0 else set()
+
+    added = tag_ids - current_ids
+    removed = current_ids - tag_ids
+
+    if len(removed) > 0:
+        through_model.objects.filter(**{service_column: service.id, "{0}__in".format(tag_column): removed}).delete()
+
+    if len(added) > 0:
+        through_model.objects.bulk_create([through_model(**{service_column: service.id, tag_column: tag_id})
+                                           for tag_id in added])
+
+    return added, removed
@@ -0,0 +1,35 @@
+from rest_framework.generics import CreateAPIView
+from rest_framework.permissions import AllowAny
+
+from common_config.api_code import HTTP_400_BAD_REQUEST, HTTP_OK
+from utils.api_response import APIResponse
+
+from services.serializers.service_option_logic import ServiceOptionVisibilitySerializer
+from services.utils.option_logic import get_service_option_logic, evaluate_service_option_logic
+
+
+class ServiceOptionVisibilityView(CreateAPIView):
+    """
+    An Api View which provides a method to evaluate service option logic for a set of answers.
+    Accepts the following POST header parameters: access token
+    Returns visible service option ids per service.
+    """
+    serializer_class = ServiceOptionVisibilitySerializer
+    permission_classes = (AllowAny,)
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(data=request.data)
+
+        if not serializer.is_valid():
+            return APIResponse(serializer.errors, HTTP_400_BAD_REQUEST)
+
+        data = []
+
+        for item in serializer.validated_data['services']:
+            # evaluate compiled service option logic decision table
+            table = get_service_option_logic(item['service_id'])
+            visible_option_ids = evaluate_service_option_logic(table, item['answers'])
+
+            data.append(dict(service_id=item['service_id'], visible_option_ids=visible_option_ids))
+
+        return APIResponse({'services': data}, HTTP_OK)
@@ -0,0 +1,42 @@
+from rest_framework.generics import CreateAPIView
+from rest_framework.permissions import AllowAny
+
+from common_config.api_code import HTTP_400_BAD_REQUEST, HTTP_OK
+from common_config.generics import get_object_or_404
+from utils.api_response import APIResponse
+
+from stores.models.store import Store
+from stores.utils.store_context import resolve_store_context
+from services.serializers.quote import QuoteSerializer
+from services.utils.quote import quote_store_services
+
+
+class StoreServiceQuoteView(CreateAPIView):
+    """
+    An Api View which provides a method to price configured store services.
+    Accepts the following POST header parameters: access token
+    Returns the quote lines and total.
+    """
+    serializer_class = QuoteSerializer
+    permission_classes = (AllowAny,)
+    lookup_field = 'store_id'
+
+    def post(self, request, *args, **kwargs):
+        store_context = resolve_store_context(store_id=self.kwargs[self.lookup_field])
+
+        if store_context is None:
+            # raise store not found error
+            get_object_or_404(Store.objects.all(), "store_id", pk=self.kwargs[self.lookup_field])
+
+        serializer = self.serializer_class(data=request.data)
+
+        if not serializer.is_valid():
+            return APIResponse(serializer.errors, HTTP_400_BAD_REQUEST)
+
+        # price all quote items from store price table
+        lines, total, errors = quote_store_services(store_context, serializer.validated_data['items'])
+
+        if errors:
+            return APIResponse({'items': errors}, HTTP_400_BAD_REQUEST)
+
+        return APIResponse(dict(items=lines, total=total), HTTP_OK)
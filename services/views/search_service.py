@@ -1,5 +1,8 @@
-from django.db.models import Q
+from django.db.models import Q, F
+from django.contrib.postgres.search import SearchRank, TrigramSimilarity
 from django.core.exceptions import ValidationError as DjangoValidationError
+from django.http import HttpResponseNotModified
+from django.utils.http import parse_etags
 from rest_framework.permissions import AllowAny
 from rest_framework.generics import ListAPIView, RetrieveAPIView
 
@@ -10,21 +13,71 @@ from common_config.api_message import INVALID_PAGE_SIZE, INVALID_PAGE_NUMBER, \
     INVALID_MIN_PRICE_MUST_LESS_THAN_MAX, \
     INVALID_SEARCH_SERVICE_ITEM_CATEGORIES, INVALID_SEARCH_SERVICE_ITEM_CATEGORIES_TAG, \
     INVALID_SEARCH_SERVICE_TOP_LEVEL, INVALID_SEARCH_SERVICE_TOP_LEVEL_TAG, INVALID_IS_PARTIAL_FLAG, \
-    INVALID_SERVICE_SEARCH_BY_NAME, INCOMPLETE_ON_BOARDING_PROCESS, STORE_DOES_NOT_ASSIGN_PRICE_LIST
-from common_config.constant import SERVICE_CATEGORY, ITEM_CATEGORY
+    INVALID_SERVICE_SEARCH_BY_NAME, INCOMPLETE_ON_BOARDING_PROCESS, STORE_DOES_NOT_ASSIGN_PRICE_LIST, \
+    INVALID_BOOLEAN_FLAG
 from common_config.generics import get_object_or_404
 from common_config.logger.logging_handler import logger
 from utils.api_response import APIResponse
 from utils.pagination import Pagination
 
 from stores.models.store import Store
-from services.models.popular_service import PopularService
+from stores.utils.store_context import resolve_store_context, STORE_SETTINGS_DOES_NOT_EXIST
+from services.utils.cursor_pagination import KeysetPaginator, CURSOR_WITH_PAGE_NUMBER
+from services.utils.popularity import get_popularity_counter
+from services.utils.search import search_query, TRIGRAM_SIMILARITY_THRESHOLD
+from services.utils.query_plan import prefetch_portal_services
+from services.utils.portal_catalog import get_portal_catalog_variant, get_portal_catalog, \
+    get_portal_catalog_validators, get_portal_services, get_popular_services, get_portal_service_data, \
+    group_portal_services, build_portal_catalog
 from price_groups.models.price_group_service import PriceGroupService, StorePriceGroupService
-from price_groups.serializers.price_group_service import CustomerPortalServiceViewSerializer, \
-    CustomerPortalServicePartialDataListSerializer
+from price_groups.serializers.price_group_service import CustomerPortalServiceViewSerializer
 
 
-class CustomerPortalServiceView(ListAPIView):
+class PortalCatalogConditionalMixin(object):
+    """
+    Conditional GET of portal catalog views, validators come from the store catalog and popularity versions
+    so a matching If-None-Match is answered before any catalog query.
+    """
+    catalog_store_kwarg = 'pk'
+    etag = None
+    last_modified = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+
+        # most popular services follow live order counts, which are not versioned
+        if request.query_params.get('most_popular', None) == "true":
+            return
+
+        self.etag, self.last_modified = get_portal_catalog_validators(self.kwargs[self.catalog_store_kwarg],
+                                                                      request.get_full_path())
+
+    def is_not_modified(self, request):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH', None)
+
+        if if_none_match is None or self.etag is None:
+            return False
+
+        etags = parse_etags(if_none_match)
+        return "*" in etags or self.etag in etags
+
+    def not_modified_response(self):
+        response = HttpResponseNotModified()
+        response['ETag'] = self.etag
+        response['Last-Modified'] = self.last_modified
+        return response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+
+        if request.method == "GET" and response.status_code == HTTP_OK and self.etag is not None:
+            response['ETag'] = self.etag
+            response['Last-Modified'] = self.last_modified
+
+        return response
+
+
+class CustomerPortalServiceView(PortalCatalogConditionalMixin, ListAPIView):
     """
     An Api View which provides a method to filter services.
     Accepts the following GET header parameters: access token
@@ -37,7 +90,7 @@ class CustomerPortalServiceView(ListAPIView):
     pagination_class = Pagination
     lookup_field = 'pk'
     query_filter_params = ["page", "page_size", "name", "max_price", "min_price", "most_popular", "item_tags",
-                           "top_level_tags", "store_id", "is_customer_side", "is_partial", "search"]
+                           "top_level_tags", "store_id", "is_customer_side", "is_partial", "search", "fuzzy", "cursor"]
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -47,6 +100,10 @@ class CustomerPortalServiceView(ListAPIView):
         self.item_tags = None
         self.popular_services = []
         self.is_partial = False
+        self.is_fuzzy = False
+        self.ordering = ("sequence", "id")
+        self.is_cursor_pagination = False
+        self.store_obj = None
 
     def get_object(self):
         queryset = Store.objects.all()
@@ -90,6 +147,12 @@ class CustomerPortalServiceView(ListAPIView):
             if "is_partial" in self.params and self.params['is_partial'] == 'true':
                 self.is_partial = True
 
+        if "fuzzy" in self.params and self.params['fuzzy'] not in ['true', 'false']:
+            self.errors.setdefault("fuzzy", []).append(INVALID_BOOLEAN_FLAG.format("fuzzy", self.params['fuzzy']))
+        else:
+            if "fuzzy" in self.params and self.params['fuzzy'] == 'true':
+                self.is_fuzzy = True
+
         if "is_customer_side" in self.params and self.params['is_customer_side'] not in ['true']:
             self.errors.setdefault("is_customer_side", []).append(INVALID_IS_CUSTOMER_SIDE_FLAG)
 
@@ -99,6 +162,19 @@ class CustomerPortalServiceView(ListAPIView):
         if "search" in self.params and self.params['search'] == "":
             self.errors.setdefault("search", []).append(INVALID_SERVICE_SEARCH_FIELD)
 
+        if "page_size" in self.params and page_size.isnumeric() and int(page_size) <= 0:
+            self.errors.setdefault("page_size", []).append(INVALID_PAGE_SIZE)
+
+        if "page" in self.params and page.isnumeric() and int(page) <= 0:
+            self.errors.setdefault("page", []).append(INVALID_PAGE_NUMBER)
+
+        # keyset pages are requested with cursor, an empty cursor requests the first page
+        if "cursor" in self.params:
+            self.is_cursor_pagination = True
+
+        if "cursor" in self.params and "page" in self.params:
+            self.errors.setdefault("cursor", []).append(CURSOR_WITH_PAGE_NUMBER)
+
         if "min_price" in self.params and self.params['min_price'].isnumeric() and "max_price" in self.params \
                 and self.params['max_price'].isnumeric():
             if self.params['min_price'] > self.params['max_price']:
@@ -151,36 +227,9 @@ class CustomerPortalServiceView(ListAPIView):
                     if top_level_tags_error:
                         self.errors.setdefault("top_level_tags", []).extend(top_level_tags_error)
 
-    @staticmethod
-    def get_all_store_service(store_obj):
-        price_group_obj = store_obj.price_group.price_group_id
-
-        service_list = [x.id for x in price_group_obj.services.filter(service_id__is_active=True,
-                                                                      service_id__status=2).order_by("id")]
-
-        store_price_group_list = StorePriceGroupService.objects.filter(price_group_service_id__in=service_list,
-                                                                       store_id=store_obj.id,
-                                                                       is_active=True,
-                                                                       is_enabled=True).order_by("id")
-        store_service_list = []
-
-        for xx in store_price_group_list:
-            if xx.price_group_service_id.id not in store_service_list:
-                store_service_list.append(xx.price_group_service_id.id)
-
-        return store_service_list
-
-    @staticmethod
-    def most_popular_services(store_id, count):
-        try:
-            return PopularService.objects.filter(store_id=store_id, count__gte=count).order_by("count").reverse()
-        except Exception as err:
-            logger.error("Un-excepted error %s", err.args[0])
-        return []
-
-    def service_filter_queryset(self, params, store_obj):
-        filter_kwargs = dict(service_id__status=2, is_enabled=True)
-        filter_kwargs['id__in'] = self.get_all_store_service(store_obj)
+    def service_filter_queryset(self, params, store_context):
+        queryset = get_portal_services(store_context)
+        filter_kwargs = dict()
 
         if "max_price" in params and "min_price" in params:
             filter_kwargs['price__range'] = (params['min_price'], params['max_price'])
@@ -197,49 +246,74 @@ class CustomerPortalServiceView(ListAPIView):
         if self.top_level_tags is not None and len(self.top_level_tags) > 0:
             filter_kwargs['service_id__category_tags__in'] = self.top_level_tags
 
-        self.popular_services = self.most_popular_services(store_obj.id, store_obj.settings.popular_service_count)
+        popular_service_count = store_context.settings['popular_service_count']
+        self.popular_services = get_popular_services(store_context.id, popular_service_count)
 
         if "most_popular" in params and params['most_popular'] == "true":
-            filter_kwargs['service_id__in'] = [ss.service_id for ss in self.popular_services]
-            return self.queryset.filter(**filter_kwargs)
+            filter_kwargs['service_id__in'] = get_popularity_counter().top(store_context.id, popular_service_count)
+            return queryset.filter(**filter_kwargs)
+
+        if "name" in params and self.is_fuzzy:
+            # typo tolerant match on service name trigram index, best match first
+            self.ordering = ("-similarity", "id")
+            return queryset.filter(service_id__name__trigram_similar=params['name'], **filter_kwargs) \
+                .annotate(similarity=TrigramSimilarity('service_id__name', params['name'])) \
+                .filter(similarity__gte=TRIGRAM_SIMILARITY_THRESHOLD).order_by('-similarity', 'id')
 
         if "name" in params:
             query = Q(service_id__name__icontains=params['name'])
             for item in filter_kwargs:
                 query = query & Q(**{item: filter_kwargs[item]})
 
-            return self.queryset.filter(query)
+            return queryset.filter(query)
 
         if "search" in params:
-            query = Q(service_id__name__icontains=params['search']) | \
-                    Q(Q(service_id__category_tags__name__icontains=params['search']) &
-                      Q(service_id__category_tags__entity_type=SERVICE_CATEGORY)) | \
-                    Q(Q(service_id__item_tags__name__icontains=params['search']) &
-                      Q(service_id__item_tags__entity_type=ITEM_CATEGORY))
+            query = search_query(params['search'])
 
-            for item in filter_kwargs:
-                query = query & Q(**{item: filter_kwargs[item]})
+            if query is None:
+                return queryset.none()
+
+            # match service search document and order by relevance
+            self.ordering = ("-rank", "id")
+            return queryset.filter(service_id__portal_search_vector=query, **filter_kwargs) \
+                .annotate(rank=SearchRank(F('service_id__portal_search_vector'), query)).order_by('-rank', 'id')
+
+        return queryset.filter(**filter_kwargs)
 
-            return self.queryset.filter(query)
+    def get_store_obj(self, store_context):
+        # store object of the serializer context, loaded only when services are serialized
+        if self.store_obj is None:
+            self.store_obj = Store.objects.get(pk=store_context.id)
 
-        return self.queryset.filter(**filter_kwargs)
+        return self.store_obj
+
+    def get_service_data(self, queryset, store_context):
+        return get_portal_service_data(queryset, self.get_store_obj(store_context), self.popular_services,
+                                       self.is_partial)
 
     def get(self, request, *args, **kwargs):
         """
         In this method validate request query parameters and filter and return service list.
         return success/error message.
         """
-        # validate and get store object
-        store_obj = self.get_object()
+        if self.is_not_modified(request):
+            return self.not_modified_response()
+
+        # validate and get store context
+        store_context = resolve_store_context(store_id=self.kwargs[self.lookup_field])
 
-        if not store_obj.is_onboarding_complete:
+        if store_context is None:
+            self.get_object()
+
+        if not store_context.is_onboarding_complete:
             return APIResponse({"error": INCOMPLETE_ON_BOARDING_PROCESS}, HTTP_400_BAD_REQUEST)
 
-        try:
-            store_obj.price_group
-        except Exception as err:
+        if store_context.price_group_id is None:
             return APIResponse({"error": STORE_DOES_NOT_ASSIGN_PRICE_LIST}, HTTP_400_BAD_REQUEST)
 
+        if store_context.settings is None:
+            return APIResponse({"error": STORE_SETTINGS_DOES_NOT_EXIST}, HTTP_400_BAD_REQUEST)
+
         self.params = request.query_params
         page_size = self.params.get('page_size', None)
         page = self.params.get('page', None)
@@ -250,11 +324,22 @@ class CustomerPortalServiceView(ListAPIView):
         if len(self.errors) > 0:
             return APIResponse({"error": self.errors}, HTTP_400_BAD_REQUEST)
 
+        variant = get_portal_catalog_variant(self.params)
+
+        if variant is not None:
+            # unfiltered portal load is served from the pre-built store catalog
+            data = get_portal_catalog(store_context.id, variant)
+
+            if data is None:
+                data = build_portal_catalog(store_context, variant, self.get_store_obj(store_context))
+
+            return APIResponse(data, HTTP_OK)
+
         error_msg = None
 
         try:
             # filter and get all service based on query params
-            queryset = self.service_filter_queryset(self.params, store_obj)
+            queryset = self.service_filter_queryset(self.params, store_context)
         except DjangoValidationError as err:
             error_msg = err.args[0]
         except Exception as err:
@@ -264,59 +349,41 @@ class CustomerPortalServiceView(ListAPIView):
         if error_msg is not None:
             return APIResponse({"error": error_msg}, HTTP_400_BAD_REQUEST)
 
-        if self.is_partial:
-            data = CustomerPortalServicePartialDataListSerializer(queryset, many=True,
-                                                                  context={
-                                                                      'popular_services': self.popular_services,
-                                                                      'is_customer_side': True,
-                                                                      'store_id': store_obj}).data
-        else:
-            data = CustomerPortalServiceViewSerializer(queryset, many=True,
-                                                       context={
-                                                           'popular_services': self.popular_services,
-                                                           'is_customer_side': True,
-                                                           'store_id': store_obj}).data
+        if not self.is_cursor_pagination:
+            services = queryset
 
-        if "is_customer_side" in self.params:
-            categories_dict = {}
-            item_tags_dict = {}
-            service_group_dict = {}
-
-            if store_obj.insurance_id is not None:
-                insurance_obj = store_obj.insurance_id
-                insurance = dict(name=insurance_obj.name, description=insurance_obj.description,
-                                 option_type=insurance_obj.option_type, price=insurance_obj.price)
-            else:
-                insurance = dict()
+            if page is not None:
+                # requested page of the same service list, facets still cover every matching service
+                page_size = int(page_size) if page_size is not None else 10
+                offset = (int(page) - 1) * page_size
+                services = queryset.order_by(*self.ordering)[offset:offset + page_size]
+
+            data = self.get_service_data(services, store_context)
 
-            for iii in data:
-                if "items" in iii['service'] and len(iii['service']['items']) > 0:
-                    for x in iii['service']['items']:
-                        if x['id'] not in item_tags_dict:
-                            item_tags_dict.setdefault(x['id'], x)
+            if "is_customer_side" in self.params:
+                return APIResponse(group_portal_services(queryset, data, store_context), HTTP_OK)
 
-                if "categories" in iii['service'] and len(iii['service']['categories']) > 0:
-                    for x in iii['service']['categories']:
-                        if x['id'] not in categories_dict:
-                            categories_dict.setdefault(x['id'], x)
-                        service_group_dict.setdefault(x['name'].strip(), []).append(iii)
+            return APIResponse(data, HTTP_OK)
 
-            # sort item and categories
-            categories = {s[0]: s[1] for s in sorted(categories_dict.items(), key=lambda k_v: k_v[1]['sequence'])}
-            item_tags = {s[0]: s[1] for s in sorted(item_tags_dict.items(), key=lambda k_v: k_v[1]['sequence'])}
+        paginator = KeysetPaginator(self.ordering, int(page_size) if page_size is not None else 10)
 
-            # sort service group
-            categories_name = [y['name'].strip() for x, y in categories.items()]
-            service_group = {key: service_group_dict[key] for key in categories_name if key in service_group_dict}
+        try:
+            # fetch only requested page rows before serialization
+            services, next_cursor = paginator.paginate(queryset, self.params.get('cursor', None))
+        except ValueError as err:
+            return APIResponse({"error": {"cursor": [err.args[0]]}}, HTTP_400_BAD_REQUEST)
 
-            result = dict(services=service_group, item_tags=item_tags, categories=categories, insurance=insurance)
+        data = self.get_service_data(services, store_context)
 
+        if "is_customer_side" in self.params:
+            result = group_portal_services(queryset, data, store_context)
+            result['next_cursor'] = next_cursor
             return APIResponse(result, HTTP_OK)
 
-        return APIResponse(data, HTTP_OK)
+        return APIResponse(dict(results=data, next_cursor=next_cursor), HTTP_OK)
 
 
-class CustomerPortalServiceDetailView(RetrieveAPIView):
+class CustomerPortalServiceDetailView(PortalCatalogConditionalMixin, RetrieveAPIView):
     """
       An Api View which provides a method to filter services.
       Accepts the following GET header parameters: access token
@@ -327,6 +394,7 @@ class CustomerPortalServiceDetailView(RetrieveAPIView):
     serializer_class = CustomerPortalServiceViewSerializer
     permission_classes = (AllowAny,)
     lookup_field = ("store_id", "pk")
+    catalog_store_kwarg = 'store_id'
 
     def get_object(self):
         queryset = StorePriceGroupService.objects.all()
@@ -345,14 +413,19 @@ class CustomerPortalServiceDetailView(RetrieveAPIView):
         In this method validate request query parameters and filter and return service list.
         return success/error message.
         """
+        if self.is_not_modified(request):
+            return self.not_modified_response()
+
         # validate and get store service object
         service_obj = self.get_object()
 
-        if not service_obj.store_id.is_onboarding_complete:
+        if not resolve_store_context(store_id=self.kwargs['store_id']).is_onboarding_complete:
             return APIResponse({"error": INCOMPLETE_ON_BOARDING_PROCESS}, HTTP_400_BAD_REQUEST)
 
         try:
-            data = CustomerPortalServiceViewSerializer(service_obj.price_group_service_id,
+            price_group_service = prefetch_portal_services([service_obj.price_group_service_id])[0]
+
+            data = CustomerPortalServiceViewSerializer(price_group_service,
                                                        context={
                                                            'popular_services': [],
                                                            'is_customer_side': True,
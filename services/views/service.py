@@ -1,5 +1,6 @@
 import ast
-from django.db.models import Q
+from django.contrib.postgres.search import SearchRank
+from django.db.models import Q, F
 from django.db import transaction
 from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework.permissions import IsAuthenticated
@@ -10,7 +11,6 @@ from common_config.api_code import HTTP_201_CREATED, HTTP_400_BAD_REQUEST, HTTP_
 from common_config.api_message import ADD_SERVICE, UPDATE_SERVICE, INVALID_PAGE_SIZE, \
     DELETE_SERVICE, EXTRA_QUERY_PARAMS, INVALID_PAGE_NUMBER, INVALID_BOOLEAN_FLAG, BLANK_PARAM, INVALID_SORT_BY, \
     INVALID_SORT_BY_FIELD_PARAM, REQUIRED_PARAMS, INVALID_STATUS_FILTER, INVALID_SERVICE_IMAGE_ID
-from common_config.constant import SERVICE_CATEGORY
 from common_config.logger.logging_handler import logger
 from common_config.generics import get_object_or_404
 from utils.api_response import APIResponse
@@ -21,6 +21,9 @@ from utils.views.service import ServiceListCreateMixin, ServiceRetrieveUpdateDel
 from services.models.service import Service
 from services.serializers.service import ServiceCreateSerializer, ServiceViewSerializer, ServiceListSerializer, \
     ServiceUpdateSerializer
+from services.tasks import resequence_service_options_task
+from services.utils.search import search_query
+from services.utils.query_plan import prefetch_service_list, prefetch_service_detail, load_service_detail
 from price_groups.tasks.store_service import linked_services_to_store_task, linked_service_and_options_to_store_task
 
 
@@ -36,7 +39,7 @@ class ServiceListCreateView(ServiceListCreateMixin):
     permission_classes = (IsAuthenticated, IsAuthorized,)
     permission_required = ('add_service', 'list_service',)
     query_filter_params = ["is_active", "include_deleted", "page", "page_size", "status", "sort_by", "search",
-                           "sort_by_field"]
+                           "sort_by_field", "include_description"]
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -101,6 +104,10 @@ class ServiceListCreateView(ServiceListCreateMixin):
                     # validate view soft deleted object view permission
                     IsAuthorized.has_include_deleted_permission(self.request, "list_service")
 
+        if "include_description" in self.params and self.params['include_description'] not in ["True", "False"]:
+            self.errors.setdefault("include_description", []).append(
+                INVALID_BOOLEAN_FLAG.format("include_description", self.params['include_description']))
+
     def filter_queryset(self, params):
         filter_kwargs = {'is_active': True}
         if "is_active" in params and params['is_active'] in ['False']:
@@ -111,45 +118,40 @@ class ServiceListCreateView(ServiceListCreateMixin):
 
         if "sort_by_field" in params:
             if params['sort_by_field'] == "name":
-                sort_by_field = "name"
+                sort_by_field = ("name",)
 
             elif params['sort_by_field'] == "status":
-                STATUS_CHOICE = Service.STATUS_CHOICES
-
-                # sort service status
-                service_status = sorted(STATUS_CHOICE, key=lambda tup: tup[1], reverse=True)
-
-                # get sorted status
-                sorted_list = [x[0] for x in service_status]
-
-                from django.db.models import Case, When
-
-                # sort by field
-                sort_by_field = Case(
-                    *[When(status=status, then=pos) for pos, status in enumerate(sorted_list)])
+                # persisted status sort position, served by (is_active, status_rank, created_on) index
+                sort_by_field = ("status_rank", "created_on")
 
             elif params['sort_by_field'] == "description":
-                sort_by_field = "description"
+                sort_by_field = ("description",)
 
             else:
-                sort_by_field = "price"
+                sort_by_field = ("price",)
         else:
-            sort_by_field = "created_on"
+            sort_by_field = ("created_on",)
 
         query = Q()
+        search = None
 
         if "search" in params:
-            query = Q(name__icontains=params['search']) | Q(description__icontains=params['search']) | \
-                    Q(Q(category_tags__name__icontains=params['search']) &
-                      Q(category_tags__entity_type=SERVICE_CATEGORY))
+            # name, category tags and description search document, served by search_vector GIN index
+            search = search_query(params['search'])
+            query = Q(search_vector=search) if search is not None else Q(name__icontains=params['search'])
 
         for item in filter_kwargs:
             query = query & Q(**{item: filter_kwargs[item]})
 
+        if search is not None and "sort_by_field" not in params:
+            # best match first
+            return self.queryset.filter(query).annotate(rank=SearchRank(F('search_vector'), search)) \
+                .order_by('-rank', '-created_on')
+
         if "sort_by" in params and params['sort_by'] == "asc":
-            return self.queryset.filter(query).order_by(sort_by_field)
+            return self.queryset.filter(query).order_by(*sort_by_field)
 
-        return self.queryset.filter(query).order_by(sort_by_field).reverse()
+        return self.queryset.filter(query).order_by(*sort_by_field).reverse()
 
     def get(self, request, *args, **kwargs):
         """
@@ -171,6 +173,9 @@ class ServiceListCreateView(ServiceListCreateMixin):
         try:
             # filter and get all service based on query params
             queryset = self.filter_queryset(self.params)
+
+            # load tags and images with prefetches, description only when requested
+            queryset = prefetch_service_list(queryset, self.params.get('include_description', None) == "True")
         except DjangoValidationError as err:
             error_msg, status_code = err.args[0], HTTP_400_BAD_REQUEST
         except Exception as err:
@@ -228,8 +233,8 @@ class ServiceListCreateView(ServiceListCreateMixin):
             logger.error("Unexpected error occurred :  %s.", err.args[0])
             return APIResponse({"message": err.args[0]}, HTTP_400_BAD_REQUEST)
 
-        # convert model object into json
-        data = ServiceViewSerializer(instance).data
+        # convert model object into json, reuse saved service object
+        data = ServiceViewSerializer(load_service_detail(instance)).data
         data['message'] = ADD_SERVICE
 
         if priceGroupServiceIdList:
@@ -264,6 +269,9 @@ class ServiceRetrieveUpdateDeleteView(ServiceRetrieveUpdateDeleteMixin):
         return obj
 
     def get(self, request, *args, **kwargs):
+        # load service detail in a fixed number of queries
+        self.queryset = prefetch_service_detail(Service.objects.all())
+
         # get service object
         instance = self.get_object()
 
@@ -317,8 +325,8 @@ class ServiceRetrieveUpdateDeleteView(ServiceRetrieveUpdateDeleteMixin):
             transaction.savepoint_rollback(sid)
             return APIResponse({"message": err.args[0]}, HTTP_400_BAD_REQUEST)
 
-        # convert model object into json
-        data = ServiceViewSerializer(instance).data
+        # convert model object into json, reuse saved service object
+        data = ServiceViewSerializer(load_service_detail(instance)).data
         data['message'] = UPDATE_SERVICE
 
         task_payload = {}
@@ -367,22 +375,14 @@ class UpdateServiceOptionSequenceNumber(ListAPIView):
     permission_required = ('change_service',)
 
     def get(self, request, *args, **kwargs):
-        services = Service.objects.all()
-
-        for service_obj in services:
-
-            options = service_obj.options.all().order_by("id")
-            sequence = 1
-
-            for option_obj in options:
-                option_obj.sequence = sequence
-                option_obj.save()
+        service_id = request.query_params.get("service_id", None)
 
-                # update price group service option
-                for price_list_option_obj in option_obj.price_group_options.all():
-                    price_list_option_obj.sequence = sequence
-                    price_list_option_obj.save()
+        if service_id is not None:
+            # validate service id
+            service_id = get_object_or_404(Service.objects.all(), "service_id",
+                                           pk=service_id if service_id.isdigit() else 0).id
 
-                sequence += 1
+        # resequence service options in background
+        task = resequence_service_options_task.delay(service_id)
 
-        return APIResponse({'message': "Service option sequence updated successfully."}, HTTP_OK)
\ No newline at end of file
+        return APIResponse({'message': "Service option sequence update started.", 'task_id': task.id}, HTTP_OK)
@@ -0,0 +1,44 @@
+import io
+from rest_framework.generics import CreateAPIView
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAuthenticated
+
+from common_config.api_code import HTTP_201_CREATED, HTTP_400_BAD_REQUEST
+from common_config.api_message import REQUIRED_FIELD
+from utils.api_response import APIResponse
+from utils.permissions import IsAuthorized
+
+from services.models.service import Service
+from services.utils.service_import import import_services, IMPORT_FORMATS, UNSUPPORTED_IMPORT_FORMAT
+
+
+class ServiceImportView(CreateAPIView):
+    """
+    An Api View which provides a method to import services with options, logic and tags from a ndjson or csv file.
+    Accepts the following POST header parameters: access token
+    Returns the import report with per row errors.
+    """
+    queryset = Service.objects.all()
+    parser_classes = (MultiPartParser,)
+    permission_classes = (IsAuthenticated, IsAuthorized,)
+    permission_required = ('add_service',)
+
+    def post(self, request, *args, **kwargs):
+        upload = request.FILES.get("file", None)
+
+        if upload is None:
+            return APIResponse({'file': [REQUIRED_FIELD]}, HTTP_400_BAD_REQUEST)
+
+        # file format from payload or file extension
+        file_format = request.data.get("format", upload.name.rsplit(".", 1)[-1]).lower()
+
+        if file_format not in IMPORT_FORMATS:
+            return APIResponse({'format': [UNSUPPORTED_IMPORT_FORMAT.format(file_format)]}, HTTP_400_BAD_REQUEST)
+
+        # stream rows from uploaded file
+        report = import_services(io.TextIOWrapper(upload.file, encoding="utf-8", newline=""), file_format, request.user)
+
+        if report['created'] <= 0 and report['errors']:
+            return APIResponse(report, HTTP_400_BAD_REQUEST)
+
+        return APIResponse(report, HTTP_201_CREATED)
@@ -11,9 +11,11 @@ from utils.api_response import APIResponse
 from utils.permissions import IsAuthorized
 
 from services.models.service_option import ServiceOption
-from services.models.service_option_logic import ServiceOptionAction, ServiceOptionRule
 from services.serializers.service import ServiceViewSerializer
 from services.serializers.service_option import ServiceOptionUpdateSerializer
+from services.utils.option_logic import remove_option_logic
+from services.utils.query_plan import load_service_detail
+from services.utils.portal_catalog import get_service_store_ids, refresh_portal_catalog
 
 
 class ServiceOptionDestroyView(DestroyAPIView):
@@ -42,11 +44,6 @@ class ServiceOptionDestroyView(DestroyAPIView):
             raise Http404(detail=INVALID_SERVICE_OPTION_MATCH_QUERY.format(self.kwargs['service_id'],
                                                                            self.kwargs['pk']), attr_name="message")
 
-    @staticmethod
-    def filter_and_get_object(model_klass, search_id, attr_name):
-        kwargs = {attr_name: search_id}
-        return model_klass.objects.filter(**kwargs)
-
     @transaction.atomic
     def delete(self, request, *args, **kwargs):
         # validate service and service option id and get object
@@ -59,34 +56,8 @@ class ServiceOptionDestroyView(DestroyAPIView):
             # delete service option
             instance.delete()
 
-            # delete service option logic
-            option_actions = self.filter_and_get_object(ServiceOptionAction, instance.id, "apply_to_option_id")
-
-            for action in option_actions:
-                # get all action rules
-                rules = action.rules.all()
-                for rule in rules:
-                    # delete rule
-                    rule.delete()
-
-                # delete action
-                action.delete()
-
-            if len(option_actions) <= 0:
-                delete_ids = []
-
-                option_rules = self.filter_and_get_object(ServiceOptionRule, instance.id, "compare_option_field")
-
-                for rule in option_rules:
-                    if rule.option_action_id not in delete_ids:
-                        delete_ids.append(rule.option_action_id)
-
-                    # delete rule
-                    rule.delete()
-
-                for obj in delete_ids:
-                    # delete action
-                    obj.delete()
+            # delete service option logic, portal catalog is refreshed by the option soft delete
+            removed_logic = remove_option_logic(instance)
 
         except Exception as err:
             logger.error("Unexpected error occurred :  %s.", err)
@@ -95,8 +66,9 @@ class ServiceOptionDestroyView(DestroyAPIView):
             return APIResponse({"message": err.args[0]}, HTTP_500_INTERNAL_SERVER_ERROR)
 
         # convert model object into json
-        data = ServiceViewSerializer(instance.service_id).data
+        data = ServiceViewSerializer(load_service_detail(instance.service_id)).data
         data['message'] = DELETE_SERVICE_OPTION
+        data['removed_logic'] = removed_logic
 
         return APIResponse(data, HTTP_OK)
 
@@ -127,11 +99,6 @@ class ServiceOptionLogicDestroyView(DestroyAPIView):
             raise Http404(detail=INVALID_SERVICE_OPTION_MATCH_QUERY.format(self.kwargs['service_id'],
                                                                            self.kwargs['pk']), attr_name="message")
 
-    @staticmethod
-    def filter_and_get_object(model_klass, search_id, attr_name):
-        kwargs = {attr_name: search_id}
-        return model_klass.objects.filter(**kwargs)
-
     @transaction.atomic
     def delete(self, request, *args, **kwargs):
         # validate and get object
@@ -142,33 +109,8 @@ class ServiceOptionLogicDestroyView(DestroyAPIView):
 
         try:
             # delete service option logic
-            option_actions = self.filter_and_get_object(ServiceOptionAction, instance.id, "apply_to_option_id")
-
-            for action in option_actions:
-                # get all action rules
-                rules = action.rules.all()
-                for rule in rules:
-                    # delete rule
-                    rule.delete()
-
-                # delete action
-                action.delete()
-
-            if len(option_actions) <= 0:
-                delete_ids = []
-
-                option_rules = self.filter_and_get_object(ServiceOptionRule, instance.id, "compare_option_field")
-
-                for rule in option_rules:
-                    if rule.option_action_id not in delete_ids:
-                        delete_ids.append(rule.option_action_id)
-
-                    # delete rule
-                    rule.delete()
-
-                for obj in delete_ids:
-                    # delete action
-                    obj.delete()
+            removed_logic = remove_option_logic(instance)
+            refresh_portal_catalog(get_service_store_ids([instance.service_id_id]))
 
         except Exception as err:
             logger.error("Unexpected error occurred :  %s.", err)
@@ -176,7 +118,7 @@ class ServiceOptionLogicDestroyView(DestroyAPIView):
             transaction.savepoint_rollback(sid)
             return APIResponse({"message": err.args[0]}, HTTP_500_INTERNAL_SERVER_ERROR)
 
-        return APIResponse({'message': DELETE_SERVICE_OPTION_LOGIC}, HTTP_OK)
+        return APIResponse({'message': DELETE_SERVICE_OPTION_LOGIC, 'removed_logic': removed_logic}, HTTP_OK)
 
 
 class ServiceOptionImageDestroyView(DestroyAPIView):
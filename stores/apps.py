@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class StoresConfig(AppConfig):
     name = 'stores'
+
+    def ready(self):
+        # connect store context cache signal receivers
+        import stores.signals
@@ -6,6 +6,7 @@ from django.core.validators import MaxValueValidator, MinValueValidator
 from activity_logs.models.manager import ActivityLogManager
 from stores.models.commission_rule import CommissionRule
 from insurances.models.insurance import Insurance
+from utils.soft_delete import soft_delete
 
 
 class Store(models.Model):
@@ -67,6 +68,12 @@ class Store(models.Model):
     objects = models.Manager()
     _activity_meta = ActivityLogManager()
 
+    # rows deactivated with soft delete
+    _soft_delete_cascade = (
+        ('addresses.StoreAddress', 'store_id'),
+        ('price_groups.StorePriceGroupService', 'store_id'),
+    )
+
     class Meta:
         db_table = 'stores'
 
@@ -77,5 +84,4 @@ class Store(models.Model):
         return "{0}".format(self.name)
 
     def delete(self, using=None, keep_parents=False):
-        self.is_active = False
-        self.save()
+        return soft_delete(self, using=using)
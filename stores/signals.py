@@ -0,0 +1,32 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from insurances.models.insurance import Insurance
+from price_groups.models.price_group import StorePriceGroup
+from stores.models.store import Store
+from stores.models.store_setting import StoreSetting
+from stores.utils.store_context import store_context_cache
+from utils.soft_delete import soft_deleted
+
+
+@receiver(post_save, sender=Store)
+def store_saved(sender, instance, **kwargs):
+    store_context_cache.invalidate(instance.id)
+
+
+@receiver(soft_deleted, sender=Store)
+def store_soft_deleted(sender, instance, **kwargs):
+    store_context_cache.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=StoreSetting)
+@receiver(post_save, sender=StorePriceGroup)
+@receiver(post_delete, sender=StorePriceGroup)
+def store_relation_changed(sender, instance, **kwargs):
+    store_context_cache.invalidate(instance.store_id_id)
+
+
+@receiver(post_save, sender=Insurance)
+def insurance_saved(sender, instance, **kwargs):
+    for store_id in Store.objects.filter(insurance_id=instance.id).values_list("id", flat=True):
+        store_context_cache.invalidate(store_id)
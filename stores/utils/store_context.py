@@ -0,0 +1,137 @@
+import time
+import threading
+from types import MappingProxyType
+from collections import OrderedDict, namedtuple
+from django.conf import settings
+from django.forms.models import model_to_dict
+
+from stores.models.store import Store
+
+StoreContext = namedtuple("StoreContext", ("id", "name", "subdomain", "white_label_domain", "is_active",
+                                           "is_onboarding_complete", "price_group_id", "settings", "insurance"))
+
+# message of a missing store settings row, as raised by the settings relation
+STORE_SETTINGS_DOES_NOT_EXIST = "Store has no settings."
+
+STORE_CONTEXT_CACHE_SIZE = getattr(settings, "STORE_CONTEXT_CACHE_SIZE", 1024)
+STORE_CONTEXT_CACHE_TTL = getattr(settings, "STORE_CONTEXT_CACHE_TTL", 60 * 5)
+
+
+class StoreContextCache(object):
+    """
+    Bounded in-process LRU cache of store context objects, entries expire after ttl seconds.
+    One context is stored under its store id, subdomain and white label domain keys.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key, None)
+
+            if entry is None:
+                return None
+
+            expires_on, context = entry
+
+            if expires_on < time.monotonic():
+                del self.entries[key]
+                return None
+
+            self.entries.move_to_end(key)
+            return context
+
+    def set(self, context):
+        expires_on = time.monotonic() + self.ttl
+
+        with self.lock:
+            for key in self.context_keys(context):
+                self.entries[key] = (expires_on, context)
+                self.entries.move_to_end(key)
+
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, store_id):
+        with self.lock:
+            for key in [key for key, entry in self.entries.items() if entry[1].id == store_id]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    @staticmethod
+    def context_keys(context):
+        keys = [("id", context.id), ("subdomain", context.subdomain)]
+
+        if context.white_label_domain:
+            keys.append(("white_label_domain", context.white_label_domain))
+
+        return keys
+
+
+store_context_cache = StoreContextCache(STORE_CONTEXT_CACHE_SIZE, STORE_CONTEXT_CACHE_TTL)
+
+
+def build_store_context(store_obj):
+    try:
+        price_group_id = store_obj.price_group.price_group_id_id
+    except Exception as err:
+        price_group_id = None
+
+    try:
+        store_settings = MappingProxyType(model_to_dict(store_obj.settings))
+    except Exception as err:
+        # store without settings row, callers report STORE_SETTINGS_DOES_NOT_EXIST
+        store_settings = None
+
+    insurance = None
+    if store_obj.insurance_id is not None:
+        insurance_obj = store_obj.insurance_id
+        insurance = MappingProxyType(dict(name=insurance_obj.name, description=insurance_obj.description,
+                                          option_type=insurance_obj.option_type, price=insurance_obj.price))
+
+    return StoreContext(id=store_obj.id, name=store_obj.name, subdomain=store_obj.subdomain,
+                        white_label_domain=store_obj.white_label_domain, is_active=store_obj.is_active,
+                        is_onboarding_complete=store_obj.is_onboarding_complete, price_group_id=price_group_id,
+                        settings=store_settings, insurance=insurance)
+
+
+def resolve_store_context(store_id=None, subdomain=None, white_label_domain=None):
+    """
+    Return store context by store id, subdomain or white label domain, None if store does not exist or
+    the white label domain is shared by more than one store
+    :param store_id:
+    :param subdomain:
+    :param white_label_domain:
+    :return:
+    """
+    if store_id is not None:
+        key = ("id", int(store_id))
+    elif subdomain:
+        key = ("subdomain", subdomain)
+    elif white_label_domain:
+        key = ("white_label_domain", white_label_domain)
+    else:
+        return None
+
+    context = store_context_cache.get(key)
+
+    if context is None:
+        # store, price group, settings and insurance in a single query
+        store_objs = list(Store.objects.select_related("price_group", "settings", "insurance_id").filter(
+            **{"id" if key[0] == "id" else key[0]: key[1]})[:2])
+
+        # white label domain is not unique, an ambiguous domain does not resolve to any store
+        if len(store_objs) != 1:
+            return None
+
+        context = build_store_context(store_objs[0])
+        store_context_cache.set(context)
+
+    return context
@@ -0,0 +1,20 @@
+from django.db import router
+from django.db.models.signals import post_save
+
+
+def send_bulk_post_save(model, instances, created=True, update_fields=None, using=None):
+    """
+    Send post_save of rows written with bulk_create or update(), e.g. for activity logs. Receivers get bulk=True,
+    receivers which refresh derived data skip it because the bulk writer refreshes once per batch.
+    :param model:
+    :param instances:
+    :param created:
+    :param update_fields:
+    :param using:
+    :return:
+    """
+    using = using or router.db_for_write(model)
+
+    for instance in instances:
+        post_save.send(sender=model, instance=instance, created=created, update_fields=update_fields, raw=False,
+                       using=using, bulk=True)
@@ -0,0 +1,49 @@
+from collections import OrderedDict
+from django.apps import apps
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+# sent once per soft delete with instance and counts {model label: deactivated rows}, cascaded rows are
+# deactivated with update() and have no post_save
+soft_deleted = Signal()
+
+
+def get_soft_delete_values(model, updated_on):
+    values = {'is_active': False}
+
+    if any(field.name == 'updated_on' for field in model._meta.concrete_fields):
+        values['updated_on'] = updated_on
+
+    return values
+
+
+def soft_delete(instance, using=None):
+    """
+    Deactivate instance and the rows declared in its model _soft_delete_cascade
+    ((app_label.ModelName, lookup to instance pk), ...) with one update per table, soft_deleted is sent once
+    with the per table counts
+    :param instance:
+    :param using:
+    :return: number of deactivated rows and {model label: deactivated rows}, as Model.delete()
+    """
+    model = type(instance)
+    updated_on = timezone.now()
+    counts = OrderedDict()
+
+    with transaction.atomic(using=using):
+        for key, value in get_soft_delete_values(model, updated_on).items():
+            setattr(instance, key, value)
+
+        instance.save(using=using)
+        counts[model._meta.label] = 1
+
+        for model_label, lookup in getattr(model, '_soft_delete_cascade', ()):
+            cascade_model = apps.get_model(model_label)
+            counts[cascade_model._meta.label] = cascade_model.objects.using(using) \
+                .filter(**{lookup: instance.pk, 'is_active': True}) \
+                .update(**get_soft_delete_values(cascade_model, updated_on))
+
+        soft_deleted.send(sender=model, instance=instance, counts=dict(counts), using=using)
+
+    return sum(counts.values()), dict(counts)